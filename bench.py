@@ -0,0 +1,325 @@
+"""Benchmarks für die FediCamp-Wetterstation.
+
+Aufruf:
+
+    python bench.py storage --years 3 --interval 60
+    python bench.py timestamps
+    python bench.py dataset --years 5 --out wetterdaten-synthetisch.csv
+    python bench.py load --years 1 --rate 20 --readers 8 --duration 30
+
+Alle Dateien landen in einem temporären Verzeichnis, bestehende Daten im
+Projektordner werden nicht angefasst. Einzige Ausnahme ist die Ausgabe von
+"dataset"; vorhandene Dateien überschreibt sie nur mit --force, die echte
+wetterdaten.csv nie.
+"""
+
+import argparse
+import atexit
+import csv
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = tempfile.mkdtemp(prefix="wetter-bench-")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+
+# wetter.py lädt beim Import Daten und Passkeys aus dem aktuellen Verzeichnis
+os.chdir(WORK_DIR)
+BENCH_PASSKEY = "BENCH"
+with open("passkey.txt", "w") as f:
+    f.write(BENCH_PASSKEY)
+sys.path.insert(0, PROJECT_DIR)
+import wetter  # noqa: E402
+
+
+def synthetic_rows(start, end, interval, seed=42):
+    # Plausible Messwerte mit Tagesgang, Wetterlagen und gelegentlichem Regen
+    rng = random.Random(seed)
+    pressure, rain_day, day = 1013.0, 0.0, None
+    for ts in range(start, end, interval):
+        hour = (ts % 86400) / 3600
+        season = math.cos((ts % (365 * 86400)) / (365 * 86400) * 2 * math.pi)
+        daily = math.sin((hour - 9) / 24 * 2 * math.pi)
+        pressure = min(1045.0, max(975.0, pressure + rng.gauss(0, 0.05)))
+        raining = rng.random() < 0.03
+        rate = rng.uniform(0.2, 8.0) if raining else 0.0
+        if day != ts // 86400:
+            day, rain_day = ts // 86400, 0.0
+        rain_day += rate * interval / 3600
+        sun = max(0.0, daily) * (600 + 300 * season)
+        yield ts, {
+            "tempf": 8 - 10 * season + 6 * daily + rng.gauss(0, 0.3),
+            "humidity": min(100.0, max(15.0, 70 - 20 * daily + rng.gauss(0, 2))),
+            "baromrelin": pressure,
+            "windspeedmph": abs(rng.gauss(8, 6)),
+            "winddir": rng.uniform(0, 360),
+            "uv": sun / 100,
+            "solarradiation": sun,
+            "dailyrainin": rain_day,
+            "hourlyrainin": rate,
+            "rainratein": rate,
+        }
+
+
+def ecowitt_form(values):
+    # Wie das Gateway sendet: imperiale Einheiten, receive_data() rechnet zurück
+    return {
+        "PASSKEY": BENCH_PASSKEY,
+        "stationtype": "GW1100B_V2.3.1",
+        "dateutc": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "tempf": f"{values['tempf'] * 9 / 5 + 32:.1f}",
+        "humidity": f"{values['humidity']:.0f}",
+        "baromrelin": f"{values['baromrelin'] / 33.8639:.3f}",
+        "windspeedmph": f"{values['windspeedmph'] / 1.60934:.2f}",
+        "winddir": f"{values['winddir']:.0f}",
+        "uv": f"{values['uv']:.0f}",
+        "solarradiation": f"{values['solarradiation']:.2f}",
+        "dailyrainin": f"{values['dailyrainin'] / 25.4:.3f}",
+        "hourlyrainin": f"{values['hourlyrainin'] / 25.4:.3f}",
+        "rainratein": f"{values['rainratein'] / 25.4:.3f}",
+        "model": "GW1100B",
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def bench_storage(args):
+    end = int(time.time())
+    start = end - int(args.years * 365 * 86400)
+    rows = list(synthetic_rows(start, end, args.interval))
+    print(f"{len(rows)} synthetische Messwerte über {args.years} Jahre\n")
+
+    rng = random.Random(1)
+    print(f"{'Backend':<10}{'Schreiben':>12}{'Größe':>12}{'Start 8d':>12}", end="")
+    for name in wetter.RANGES:
+        print(f"{'p50 ' + name:>12}", end="")
+    print()
+
+    for name, cls in wetter.STORAGES.items():
+        path = os.path.join(WORK_DIR, f"bench-{name}")
+        storage = cls(path)
+        write_time = 0.0
+        for i in range(0, len(rows), args.batch):
+            dt, _ = timed(storage.append_many, rows[i : i + args.batch])
+            write_time += dt
+
+        # Kaltstart: was load_history() für den Speicher lesen muss
+        load_time, _ = timed(
+            lambda: sum(1 for _ in storage.read(end - wetter.STORE_RETENTION))
+        )
+        print(
+            f"{name:<10}{write_time:>11.2f}s{storage.size() / 1e6:>10.1f}MB"
+            f"{load_time:>11.3f}s",
+            end="",
+        )
+        for span in wetter.RANGES.values():
+            if span > end - start:
+                # Zeitraum länger als der Bestand, kein sinnvolles Abfragefenster
+                print(f"{'–':>12}", end="")
+                continue
+            samples = []
+            for _ in range(args.queries):
+                q_end = rng.randint(start + span, end)
+                dt, _ = timed(lambda: sum(1 for _ in storage.read(q_end - span, q_end)))
+                samples.append(dt)
+            print(f"{percentile(samples, 0.5) * 1000:>10.1f}ms", end="")
+        print()
+        storage.close()
+    skipped = [name for name, span in wetter.RANGES.items() if span > end - start]
+    if skipped:
+        print(f"\nÜbersprungen (länger als {args.years} Jahre): {', '.join(skipped)}")
+
+
+def bench_timestamps(args):
+    # Bisherige Wege (strptime/strftime pro Zeile, kompletter Durchlauf) gegen die neuen
+    end = int(time.time())
+    stamps = list(range(end - args.rows * args.interval, end, args.interval))
+    texts = [datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") for ts in stamps]
+
+    def old_parse():
+        return [
+            int(datetime.strptime(t, "%Y-%m-%d %H:%M:%S").timestamp()) for t in texts
+        ]
+
+    def old_format():
+        return [datetime.fromtimestamp(ts).strftime("%d.%m %H:%M") for ts in stamps]
+
+    path = os.path.join(WORK_DIR, "timestamps.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp"] + wetter.FIELDS)
+        for text in texts:
+            writer.writerow([text] + [0.0] * len(wetter.FIELDS))
+
+    def old_read():
+        # Bisher: jede Zeile parsen und dann vergleichen
+        return [ts for ts in old_parse() if ts >= end - 86400]
+
+    cases = [
+        ("Parsen alt", old_parse),
+        ("Parsen neu", lambda: [wetter.parse_timestamp(t) for t in texts]),
+        ("Formatieren alt", old_format),
+        ("Formatieren neu", lambda: [wetter.format_timestamp(ts) for ts in stamps]),
+        ("24h lesen alt", old_read),
+        ("24h lesen neu", lambda: list(wetter.read_csv_rows(path, end - 86400))),
+    ]
+    print(f"{len(stamps)} Zeilen, bestes von {args.repeat} Läufen\n")
+    for name, fn in cases:
+        best = min(timed(fn)[0] for _ in range(args.repeat))
+        print(f"{name:<18}{best * 1000:>10.1f}ms")
+
+
+def bench_dataset(args):
+    # Synthetischer Bestand im Schema von wetterdaten.csv
+    end = int(time.time())
+    start = end - int(args.years * 365 * 86400)
+    path = os.path.join(PROJECT_DIR, args.out)
+    if os.path.abspath(path) == os.path.join(PROJECT_DIR, wetter.DATA_FILE):
+        sys.exit(f"{args.out} sind die echten Messwerte, bitte anderen Namen wählen")
+    if os.path.exists(path) and not args.force:
+        sys.exit(f"{args.out} existiert schon (--force zum Überschreiben)")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp"] + wetter.FIELDS)
+        for n, (ts, values) in enumerate(synthetic_rows(start, end, args.interval), 1):
+            stamp = (
+                datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+                if args.legacy
+                else ts
+            )
+            writer.writerow([stamp] + [round(values[key], 2) for key in wetter.FIELDS])
+    print(f"{n} Zeilen nach {args.out} geschrieben")
+
+
+def bench_load(args):
+    # Bestand anlegen, dann gleichzeitig POSTs einspielen und /api/data abfragen
+    station = wetter.stations[wetter.DEFAULT_STATION]
+    end = int(time.time())
+    rows = list(synthetic_rows(end - int(args.years * 365 * 86400), end, args.interval))
+    for i in range(0, len(rows), 10000):
+        station.storage.append_many(rows[i : i + 10000])
+    load_time, _ = timed(station.load_history)
+    print(f"{len(rows)} Messwerte im Bestand, Start in {load_time:.2f}s")
+    if args.no_cache:
+        wetter.data_cache.maxsize = 0
+
+    latencies = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def record(name, dt):
+        with lock:
+            latencies.setdefault(name, []).append(dt)
+
+    def writer():
+        client = wetter.app.test_client()
+        forms = synthetic_rows(end, end + 10**9, args.interval, seed=7)
+        t0 = time.perf_counter()
+        try:
+            for i in range(int(args.rate * args.duration)):
+                delay = t0 + i / args.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                _, values = next(forms)
+                dt, response = timed(client.post, "/", data=ecowitt_form(values))
+                ok = response.status_code == 200
+                record("POST /" if ok else "POST / Fehler", dt)
+        finally:
+            stop.set()
+
+    def reader(seed):
+        client = wetter.app.test_client()
+        rng = random.Random(seed)
+        while not stop.is_set():
+            range_ = rng.choice(args.ranges)
+            url = f"/api/data?range={range_}&max_points={args.max_points}"
+            dt, _ = timed(client.get, url, headers={"Accept-Encoding": "gzip"})
+            record(f"GET {range_}", dt)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    drain, _ = timed(station.ingest.wait)
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n{'Anfrage':<16}{'Anzahl':>8}{'pro s':>10}{'p50':>10}{'p99':>10}")
+    for name, values in sorted(latencies.items()):
+        print(
+            f"{name:<16}{len(values):>8}{len(values) / elapsed:>10.1f}"
+            f"{percentile(values, 0.5) * 1000:>8.1f}ms"
+            f"{percentile(values, 0.99) * 1000:>8.1f}ms"
+        )
+    print(
+        f"\nWarteschlange nach {drain * 1000:.0f}ms leer, "
+        f"Cache: {wetter.data_cache.hits} Treffer, {wetter.data_cache.misses} Fehlschläge"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    storage_cmd = sub.add_parser("storage", help="Speicher-Backends vergleichen")
+    storage_cmd.add_argument("--years", type=float, default=3)
+    storage_cmd.add_argument("--interval", type=int, default=60)
+    storage_cmd.add_argument("--batch", type=int, default=10000)
+    storage_cmd.add_argument("--queries", type=int, default=5)
+    storage_cmd.set_defaults(func=bench_storage)
+
+    ts_cmd = sub.add_parser("timestamps", help="Zeitstempel parsen und formatieren")
+    ts_cmd.add_argument("--rows", type=int, default=200000)
+    ts_cmd.add_argument("--interval", type=int, default=60)
+    ts_cmd.add_argument("--repeat", type=int, default=3)
+    ts_cmd.set_defaults(func=bench_timestamps)
+
+    data_cmd = sub.add_parser("dataset", help="Synthetische wetterdaten.csv erzeugen")
+    data_cmd.add_argument("--years", type=float, default=3)
+    data_cmd.add_argument("--interval", type=int, default=60)
+    data_cmd.add_argument("--out", default="wetterdaten-synthetisch.csv")
+    data_cmd.add_argument(
+        "--legacy", action="store_true", help="Zeitstempel als Ortszeit-Text"
+    )
+    data_cmd.add_argument(
+        "--force", action="store_true", help="vorhandene Datei überschreiben"
+    )
+    data_cmd.set_defaults(func=bench_dataset)
+
+    load_cmd = sub.add_parser("load", help="POSTs einspielen und parallel abfragen")
+    load_cmd.add_argument("--years", type=float, default=1)
+    load_cmd.add_argument("--interval", type=int, default=60)
+    load_cmd.add_argument("--rate", type=float, default=10, help="POSTs pro Sekunde")
+    load_cmd.add_argument("--duration", type=float, default=20, help="Sekunden")
+    load_cmd.add_argument("--readers", type=int, default=8)
+    load_cmd.add_argument(
+        "--ranges", type=lambda v: v.split(","), default=["1h", "24h", "7d"]
+    )
+    load_cmd.add_argument("--max-points", type=int, default=500)
+    load_cmd.add_argument("--no-cache", action="store_true", help="Antwort-Cache aus")
+    load_cmd.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
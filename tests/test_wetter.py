@@ -0,0 +1,168 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def wetter(tmp_path, monkeypatch):
+    # wetter.py liest beim Import aus dem Arbeitsverzeichnis, also frisch laden
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "passkey.txt").write_text("KEY\n")
+    sys.modules.pop("wetter", None)
+    module = importlib.import_module("wetter")
+    yield module
+    for station in module.stations.values():
+        station.ingest.stop()
+        station.storage.close()
+
+
+def test_stream_head_releases_slot(wetter):
+    feed = wetter.stations["default"].feed
+    client = wetter.app.test_client()
+    for _ in range(feed.max_clients + 1):
+        client.head("/api/stream").close()
+    assert feed.clients == 0
+    response = client.get("/api/stream", buffered=False)
+    assert response.status_code == 200
+    assert next(response.response) == b"retry: 5000\n\n"
+    response.close()
+    assert feed.clients == 0
+
+
+def test_binary_append_reports_dropped_samples(wetter, tmp_path):
+    storage = wetter.BinaryStorage(str(tmp_path / "test.bin"))
+    values = dict.fromkeys(wetter.FIELDS, 1.0)
+    assert storage.append_many([(100, values), (200, values)]) == 2
+    assert storage.append_many([(150, values), (300, values)]) == 1
+    assert [ts for ts, _ in storage.read()] == [100, 200, 300]
+    storage.close()
+
+
+def test_import_failure_keeps_inserted_rows_consistent(wetter):
+    station = wetter.stations["default"]
+    end = int(wetter.time.time())
+    start = end - 60000 * 10
+    lines = ["timestamp," + ",".join(wetter.FIELDS)]
+    lines += [
+        f"{start + i * 10}," + ",".join(["1.0"] * len(wetter.FIELDS))
+        for i in range(60000)
+    ]
+    body = ("\n".join(lines) + "\n").encode() + b"\xff\n"
+    response = wetter.app.test_client().post(
+        "/api/import",
+        data=body,
+        headers={"X-Passkey": "KEY", "Content-Type": "text/csv"},
+    )
+    assert response.status_code == 400
+    stats = response.get_json()
+    assert "error" in stats
+    assert stats["inserted"] == wetter.IMPORT_BATCH
+    assert sum(1 for _ in station.storage.read()) == wetter.IMPORT_BATCH
+    assert len(station.store) == wetter.IMPORT_BATCH
+    assert station.rollups.tiers[-1].query(start)
+
+
+def test_ingest_thread_survives_publish_errors(wetter, monkeypatch):
+    station = wetter.stations["default"]
+
+    def publish(samples):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(station, "publish", publish)
+    client = wetter.app.test_client()
+    for _ in range(2):
+        assert (
+            client.post("/", data={"PASSKEY": "KEY", "tempf": "10"}).status_code == 200
+        )
+        station.ingest.wait()
+    assert station.ingest.thread.is_alive()
+    assert sum(1 for _ in station.storage.read()) == 2
+    station.ingest.stop()
+    assert client.post("/", data={"PASSKEY": "KEY", "tempf": "10"}).status_code == 503
+
+
+@pytest.mark.parametrize("backend", ["csv", "daily", "binary"])
+def test_failed_insert_keeps_existing_rows(wetter, tmp_path, monkeypatch, backend):
+    cls = wetter.STORAGES[backend]
+    storage = cls(str(tmp_path / f"test-{backend}"))
+    values = dict.fromkeys(wetter.FIELDS, 1.0)
+    end = int(wetter.time.time())
+    rows = [(end - 3600 + i * 60, values) for i in range(60)]
+    storage.append_many(rows[::2])
+
+    merge_new = wetter.merge_new
+
+    def broken(existing, new):
+        # Mitten im Mischen geht der Platz aus
+        for i, item in enumerate(merge_new(existing, new)):
+            if i == 5:
+                raise OSError(28, "No space left on device")
+            yield item
+
+    monkeypatch.setattr(wetter, "merge_new", broken)
+    with pytest.raises(OSError):
+        storage.insert_many(rows[1::2])
+    assert [ts for ts, _ in storage.read()] == [ts for ts, _ in rows[::2]]
+    monkeypatch.undo()
+    assert storage.insert_many(rows[1::2]) == 30
+    assert [ts for ts, _ in storage.read()] == [ts for ts, _ in rows]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    storage.close()
+
+
+def test_import_merges_into_rollups_without_raw_data(wetter):
+    station = wetter.stations["default"]
+    values = dict.fromkeys(wetter.FIELDS, 1.0)
+    now = int(wetter.time.time())
+    # Verdichtete Tage, deren Rohdaten schon gelöscht sind
+    old = list(range(now - 20 * 86400, now - 10 * 86400, 3600))
+    station.rollups.merge_many(old, {key: [1.0] * len(old) for key in wetter.FIELDS})
+    daily = station.rollups.tiers[-1]
+    before = sum(row[0] for row in daily.query(0)[1])
+    stats = station.import_rows([(old[5] + 60, values), (old[5] + 60, values)])
+    assert stats["inserted"] == 1 and stats["duplicates"] == 1
+    assert sum(row[0] for row in daily.query(0)[1]) == before + 1
+    # Ein zweiter Import derselben Werte zählt nicht doppelt
+    assert station.import_rows([(old[5] + 60, values)])["inserted"] == 0
+    assert sum(row[0] for row in daily.query(0)[1]) == before + 1
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_daily_rollups_follow_local_days_across_dst(
+    wetter, tmp_path, monkeypatch, bulk
+):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    wetter.time.tzset()
+    monkeypatch.setattr(wetter, "np", wetter.np if bulk else None)
+    wetter.local_midnight.cache_clear()
+    try:
+        rollups = wetter.Rollups(str(tmp_path / "rollups"))
+        values = dict.fromkeys(wetter.FIELDS, 1.0)
+        expected = {}
+        for first, last in [("2026-03-27", "2026-04-01"), ("2026-10-23", "2026-10-28")]:
+            ts = int(wetter.datetime.fromisoformat(first).timestamp())
+            end = int(wetter.datetime.fromisoformat(last).timestamp())
+            stamps = list(range(ts, end, 600))
+            for t in stamps:
+                day = wetter.datetime.fromtimestamp(t).date().isoformat()
+                expected[day] = expected.get(day, 0) + 1
+            rollups.merge_many(
+                stamps, {key: [1.0] * len(stamps) for key in wetter.FIELDS}
+            )
+        daily = rollups.tiers[-1]
+        timestamps, rows = daily.query(0)
+        got = {
+            wetter.datetime.fromtimestamp(t).date().isoformat(): row[0]
+            for t, row in zip(timestamps, rows)
+        }
+        assert got == expected
+        assert expected["2026-03-29"] == 138 and expected["2026-10-25"] == 150
+        assert all(wetter.datetime.fromtimestamp(t).hour == 0 for t in timestamps)
+    finally:
+        monkeypatch.undo()
+        wetter.time.tzset()
+        wetter.local_midnight.cache_clear()
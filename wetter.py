@@ -1,20 +1,2679 @@
-from flask import Flask, request, jsonify, render_template_string, abort, redirect
+from flask import (
+    Flask,
+    request,
+    jsonify,
+    render_template_string,
+    abort,
+    redirect,
+    make_response,
+    Response,
+    g,
+)
+import argparse
+import atexit
 import csv
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import math
+import mmap
 import os
-from datetime import datetime, timedelta
+import queue
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 app = Flask(__name__)
 DATA_FILE = "wetterdaten.csv"
+SQLITE_FILE = "wetterdaten.sqlite"
+PARTITION_DIR = "data"
+BINARY_FILE = "wetterdaten.bin"
+# Speicher-Backend für die Rohwerte: "csv", "sqlite", "daily" oder "binary"
+STORAGE_BACKEND = os.environ.get("WETTER_STORAGE", "csv")
+
+# Tagesdateien ("daily"): nach so vielen Tagen gzip-komprimieren bzw. löschen.
+# Gelöschte Tage bleiben in den Verdichtungen unter rollups/ erhalten.
+PARTITION_COMPRESS_DAYS = int(os.environ.get("WETTER_COMPRESS_DAYS", 7))
+PARTITION_DELETE_DAYS = int(os.environ.get("WETTER_DELETE_DAYS", 0)) or None
 LOG_FILE = "debug_post.log"
 PASSKEY_FILE = "passkey.txt"
+# Weitere Stationen bekommen ein eigenes Verzeichnis unter stations/<id>/
+STATIONS_DIR = "stations"
+DEFAULT_STATION = "default"
+
+# Messwerte in der Reihenfolge, in der sie in der CSV stehen
+FIELDS = [
+    "tempf",
+    "humidity",
+    "baromrelin",
+    "windspeedmph",
+    "winddir",
+    "uv",
+    "solarradiation",
+    "dailyrainin",
+    "hourlyrainin",
+    "rainratein",
+]
+
+# Obergrenzen der Histogramm-Buckets für /metrics
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+ROWS_BUCKETS = [10, 100, 1000, 10000, 100000, 1000000]
+
+# Nachkommastellen je Feld in /api/data, etwa so fein wie die Sensoren messen
+FIELD_DECIMALS = {
+    "tempf": 1,
+    "humidity": 0,
+    "baromrelin": 1,
+    "windspeedmph": 1,
+    "winddir": 0,
+    "uv": 1,
+    "solarradiation": 1,
+    "dailyrainin": 2,
+    "hourlyrainin": 2,
+    "rainratein": 2,
+    "dewpoint": 1,
+    "heatindex": 1,
+    "windchill": 1,
+    "pressure_tendency": 1,
+    "rain_1h": 2,
+    "rain_24h": 2,
+}
+
+# Abgeleitete Größen für /api/data?derived=1. Dafür wird so weit vor dem Zeitraum
+# gelesen, dass auch die ersten Punkte volle 3-h-Tendenz und 24-h-Regensumme haben.
+DERIVED_FIELDS = [
+    "dewpoint",
+    "heatindex",
+    "windchill",
+    "pressure_tendency",
+    "rain_1h",
+    "rain_24h",
+]
+DERIVED_LOOKBACK = 24 * 3600
+PRESSURE_TENDENCY_SPAN = 3 * 3600
+
+# JSON-Antworten ab dieser Größe werden komprimiert (schnelle Stufen, da pro Abfrage)
+COMPRESS_MIN_SIZE = 1024
+
+# /api/export: Formate und Zeilen pro Block (bei Parquet pro Zeilengruppe)
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_BATCH = 5000
+
+# Import: Zeilen pro sortiertem Block, der auf einmal einsortiert wird
+IMPORT_BATCH = 50000
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+}
+IMPORT_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+)
+# Spalten der Ecowitt-Exporte (SD-Karte, ecowitt.net) → Formularfelder des Gateways
+ECOWITT_COLUMNS = [
+    ("tempf", r"outdoor temp"),
+    ("humidity", r"outdoor humidity"),
+    ("baromrelin", r"rel\w* pressure|pressure rel"),
+    ("windspeedmph", r"^wind( speed)?$"),
+    ("winddir", r"wind direction"),
+    ("uv", r"^uvi?$"),
+    ("solarradiation", r"solar"),
+    ("rainratein", r"rain rate"),
+    ("hourlyrainin", r"hourly"),
+    ("dailyrainin", r"daily"),
+]
+# Faktoren von metrischen Export-Einheiten zurück auf die Einheiten, die das
+# Gateway per POST schickt; danach gelten dieselben Umrechnungen wie beim Empfang
+ECOWITT_UNITS = {
+    "km/h": 1 / 1.60934,
+    "m/s": 3.6 / 1.60934,
+    "mm": 1 / 25.4,
+    "mm/h": 1 / 25.4,
+    "mm/hr": 1 / 25.4,
+    "mmhg": 1 / 25.4,
+}
+
+# Cache für fertige /api/data-Antworten: Anzahl Einträge und maximales Alter in
+# Sekunden (auch ohne neue Messwerte rutscht der Zeitraum weiter)
+CACHE_SIZE = int(os.environ.get("WETTER_CACHE_SIZE", 256))
+CACHE_TTL = float(os.environ.get("WETTER_CACHE_TTL", 30))
+# Parameter, die das Ergebnis von /api/data bestimmen (alles andere zählt nicht)
+DATA_PARAMS = (
+    "range",
+    "max_points",
+    "resolution",
+    "mode",
+    "field",
+    "since",
+    "precision",
+    "format",
+    "derived",
+)
+
+# Zeiträume für /api/data in Sekunden
+RANGES = {
+    "1h": 3600,
+    "24h": 24 * 3600,
+    "7d": 7 * 24 * 3600,
+    "30d": 30 * 24 * 3600,
+    "1y": 365 * 24 * 3600,
+}
+
+# So lange bleiben Rohwerte im Speicher (etwas mehr als der längste Zeitraum)
+STORE_RETENTION = 8 * 24 * 3600
+
+# Betrieb mit mehreren Prozessen (z. B. gunicorn -w 4): "single" (Standard, ein
+# Prozess macht alles), "auto" (wer zuerst wetter.lock sperrt, schreibt, alle
+# anderen lesen), "writer" oder "reader". Leser brauchen WETTER_STORAGE=binary,
+# geben Messwerte per Unix-Socket an den Schreiber und lesen aus der mmap.
+WORKER_ROLE = os.environ.get("WETTER_ROLE", "single")
+WRITER_LOCK = "wetter.lock"
+INGEST_SOCKET = "ingest.sock"
+# So oft schauen Leser nach neuen Datensätzen im Kopf der Binärdatei (Sekunden)
+FOLLOW_INTERVAL = 0.5
+
+# Server-Sent Events: maximale Verbindungen, Heartbeat und Laufzeit in Sekunden
+SSE_MAX_CLIENTS = int(os.environ.get("WETTER_SSE_MAX_CLIENTS", 200))
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = 300
+
+# Annahme von Messwerten: Größe der Warteschlange, maximale Sammelgröße und
+# wann auf Platte gesichert wird ("always" pro Schreibvorgang, "interval" spätestens
+# alle WETTER_FSYNC_INTERVAL Sekunden, "never" überlässt es dem Betriebssystem)
+INGEST_QUEUE_SIZE = int(os.environ.get("WETTER_INGEST_QUEUE", 10000))
+INGEST_BATCH_SIZE = int(os.environ.get("WETTER_BATCH_SIZE", 500))
+FSYNC_POLICY = os.environ.get("WETTER_FSYNC", "interval")
+FSYNC_INTERVAL = float(os.environ.get("WETTER_FSYNC_INTERVAL", 5))
+
+# Debug-Log als JSON-Zeilen. Stufen: "off", "error" (nur Fehler samt der Nutzlast,
+# die nicht eingelesen werden konnte), "info" (zusätzlich jede WETTER_LOG_SAMPLE-te
+# Nutzlast) oder "debug" (jede Nutzlast). Rotiert nach Größe oder Alter, ältere
+# Dateien werden gzip-komprimiert, nur WETTER_LOG_BACKUPS davon bleiben liegen.
+LOG_LEVELS = {"off": 0, "error": 1, "info": 2, "debug": 3}
+LOG_LEVEL = os.environ.get("WETTER_LOG_LEVEL", "info")
+LOG_SAMPLE = int(os.environ.get("WETTER_LOG_SAMPLE", 100))
+LOG_MAX_BYTES = int(os.environ.get("WETTER_LOG_MAX_BYTES", 1024 * 1024))
+LOG_MAX_AGE = int(os.environ.get("WETTER_LOG_MAX_AGE", 24 * 3600))
+LOG_BACKUPS = int(os.environ.get("WETTER_LOG_BACKUPS", 5))
+LOG_COMPRESS = os.environ.get("WETTER_LOG_COMPRESS", "1") != "0"
+# Formularfelder, die nie im Log landen
+REDACTED_FIELDS = {"PASSKEY"}
+
+# Vorberechnete Verdichtungsstufen: (Bucket-Breite, Aufbewahrung) in Sekunden
+ROLLUP_DIR = "rollups"
+ROLLUP_TIERS = [
+    (60, 2 * 24 * 3600),
+    (600, 40 * 24 * 3600),
+    (3600, 400 * 24 * 3600),
+    (24 * 3600, None),
+]
+
+# Felder mit Summe/Min/Max; die Windrichtung wird als Vektor gemittelt
+SCALAR_FIELDS = [key for key in FIELDS if key != "winddir"]
+ROLLUP_COLUMNS = ["count"]
+for _key in SCALAR_FIELDS:
+    ROLLUP_COLUMNS += [f"{_key}_sum", f"{_key}_min", f"{_key}_max"]
+ROLLUP_COLUMNS += ["winddir_x", "winddir_y"]
+
+# Warnregeln (Frost, Sturm, Starkregen, UV …), eine pro Zeile in alerts.txt.
+# Ausgelöste und aufgehobene Warnungen landen als JSON-Zeilen in WETTER_ALERT_LOG
+# und werden, falls gesetzt, per POST an WETTER_ALERT_WEBHOOK geschickt.
+ALERT_FILE = "alerts.txt"
+ALERT_LOG = os.environ.get("WETTER_ALERT_LOG", "alerts.log")
+ALERT_WEBHOOK = os.environ.get("WETTER_ALERT_WEBHOOK") or None
+ALERT_TIMEOUT = 5
+# Beim Start mindestens so weit zurück auswerten, damit eine noch laufende
+# Warnung nach einem Neustart nicht erneut gemeldet wird (Sekunden)
+ALERT_RESUME = 3600
+ALERT_AGGREGATES = ("avg", "min", "max", "sum")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 24 * 3600}
+
+
+def load_passkeys(path):
+    # Eine Zeile pro Gateway: "PASSKEY" (Standardstation) oder "PASSKEY stations-id"
+    passkeys = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            station = parts[1] if len(parts) > 1 else DEFAULT_STATION
+            if not re.fullmatch(r"[A-Za-z0-9_-]+", station):
+                raise SystemExit(f"Ungültige Stations-ID in {path}: {station}")
+            passkeys[parts[0]] = station
+    return passkeys
+
+
+# Versuch, die Passkeys aus externer Datei zu laden
+if os.path.exists(PASSKEY_FILE):
+    PASSKEYS = load_passkeys(PASSKEY_FILE)
+else:
+    PASSKEYS = {}
+    print("⚠️  WARNUNG: Datei 'passkey.txt' fehlt. POST-Zugriff wird verweigert.")
+
+
+def parse_duration(value):
+    # "90s", "5m", "1h", "2d" → Sekunden
+    return int(value[:-1]) * DURATION_UNITS[value[-1]]
+
+
+ALERT_RULE = re.compile(
+    r"(?P<name>[\w-]+):\s*(?P<field>\w+)(?:\s+(?P<agg>\w+))?"
+    r"\s*(?P<op>[<>])\s*(?P<threshold>-?\d+(?:\.\d+)?)"
+    r"(?:\s+over\s+(?P<over>\d+[smhd]))?"
+    r"(?:\s+for\s+(?P<hold>\d+[smhd]))?"
+    r"(?:\s+clear\s+(?P<clear>-?\d+(?:\.\d+)?))?"
+    r"(?:\s+station\s+(?P<station>[A-Za-z0-9_-]+))?"
+)
+
+
+def load_alert_rules(path):
+    # Eine Regel pro Zeile, z. B. "sturm: windspeedmph > 60 for 5m clear 45" oder
+    # "starkregen: rainratein avg > 10 over 1h clear 5 station garten"
+    rules = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            match = ALERT_RULE.fullmatch(line)
+            if (
+                match is None
+                or match["field"] not in FIELDS
+                or (match["agg"] is not None) != (match["over"] is not None)
+                or match["agg"] not in (None, *ALERT_AGGREGATES)
+            ):
+                raise SystemExit(f"Ungültige Warnregel in {path}, Zeile {number}")
+            threshold = float(match["threshold"])
+            clear = threshold if match["clear"] is None else float(match["clear"])
+            # Die Aufhebeschwelle muss auf der "harmlosen" Seite liegen
+            if (clear > threshold) if match["op"] == ">" else (clear < threshold):
+                raise SystemExit(f"Ungültige Aufhebeschwelle in {path}, Zeile {number}")
+            rules.append(
+                {
+                    "name": match["name"],
+                    "field": match["field"],
+                    "agg": match["agg"],
+                    "op": match["op"],
+                    "threshold": threshold,
+                    "clear": clear,
+                    "over": parse_duration(match["over"]) if match["over"] else 0,
+                    "hold": parse_duration(match["hold"]) if match["hold"] else 0,
+                    "station": match["station"],
+                }
+            )
+    return rules
+
+
+ALERT_RULES = load_alert_rules(ALERT_FILE) if os.path.exists(ALERT_FILE) else []
+
+
+def claim_role(role=WORKER_ROLE):
+    global writer_lock
+    if role not in ("single", "auto", "writer", "reader"):
+        raise SystemExit(f"Unbekannte Rolle: {role}")
+    if role != "single" and STORAGE_BACKEND != "binary":
+        raise SystemExit("Mehrere Prozesse brauchen WETTER_STORAGE=binary")
+    if role != "auto":
+        return role
+    if fcntl is None:
+        raise SystemExit("WETTER_ROLE=auto braucht fcntl (Linux/macOS)")
+    # Die Sperre hält, solange der Prozess lebt; stirbt er, übernimmt ein neuer
+    writer_lock = open(WRITER_LOCK, "w")
+    try:
+        fcntl.flock(writer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        writer_lock.close()
+        return "reader"
+    return "writer"
+
+
+ROLE = claim_role()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Counter:
+    """Zähler für /metrics. Wird nur im Speicher hochgezählt, das Abfragen
+    kostet also weder Dateizugriffe noch Rechenzeit."""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, value in values.items():
+            yield f"{self.name}{format_labels(dict(key))} {value}"
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets):
+        super().__init__(name, help)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self):
+        with self.lock:
+            values = {
+                key: (list(counts), total)
+                for key, (counts, total) in self.values.items()
+            }
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, (counts, total) in values.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                bucket = format_labels(dict(labels, le=bound))
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{format_labels(labels)} {total}"
+            yield f"{self.name}_count{format_labels(labels)} {cumulative}"
+
+
+REQUEST_SECONDS = Histogram(
+    "wetter_request_duration_seconds", "Bearbeitungszeit je Route", LATENCY_BUCKETS
+)
+INGEST_SECONDS = Histogram(
+    "wetter_ingest_flush_seconds",
+    "Dauer eines gebündelten Schreibvorgangs",
+    LATENCY_BUCKETS,
+)
+QUERY_ROWS = Histogram(
+    "wetter_query_rows_scanned", "Gelesene Zeilen bzw. Buckets je Abfrage", ROWS_BUCKETS
+)
+SAMPLES_INGESTED = Counter("wetter_samples_ingested_total", "Geschriebene Messwerte")
+SAMPLES_REJECTED = Counter(
+    "wetter_samples_rejected_total", "Abgewiesene Messwerte (Warteschlange voll)"
+)
+SAMPLES_DROPPED = Counter(
+    "wetter_samples_dropped_total",
+    "Verworfene Messwerte (älter als der zuletzt gespeicherte)",
+)
+PARSE_ERRORS = Counter(
+    "wetter_parse_errors_total", "Nicht lesbare Formularfelder beim Empfang"
+)
+ROWS_SKIPPED = Counter(
+    "wetter_rows_skipped_total", "Beim Lesen übersprungene kaputte CSV-Zeilen"
+)
+ALERTS = Counter("wetter_alerts_total", "Ausgelöste und aufgehobene Warnungen")
+METRICS = [
+    REQUEST_SECONDS,
+    INGEST_SECONDS,
+    QUERY_ROWS,
+    SAMPLES_INGESTED,
+    SAMPLES_REJECTED,
+    SAMPLES_DROPPED,
+    PARSE_ERRORS,
+    ROWS_SKIPPED,
+    ALERTS,
+]
+
+
+class SampleStore:
+    """Spaltenorientierter Ringpuffer: ein Array pro Messwert plus Epoch-Zeitstempel."""
+
+    def __init__(self, retention=STORE_RETENTION):
+        self.retention = retention
+        self.ts = array("q")
+        self.columns = {key: array("d") for key in FIELDS}
+        self.lock = threading.Lock()
+        # Zählt jede Änderung mit, z. B. für ETags
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.ts)
+
+    def latest(self):
+        with self.lock:
+            if not self.ts:
+                return self.seq, None, None
+            return (
+                self.seq,
+                self.ts[-1],
+                {key: col[-1] for key, col in self.columns.items()},
+            )
+
+    def append(self, ts, values):
+        with self.lock:
+            self.seq += 1
+            if self.ts and ts < self.ts[-1]:
+                # Verspätete Werte einsortieren, damit die Bisektion stimmt
+                idx = bisect_right(self.ts, ts)
+                self.ts.insert(idx, ts)
+                for key, col in self.columns.items():
+                    col.insert(idx, values[key])
+            else:
+                self.ts.append(ts)
+                for key, col in self.columns.items():
+                    col.append(values[key])
+            self._trim()
+
+    def _trim(self):
+        # Alte Werte blockweise abschneiden, damit append amortisiert O(1) bleibt
+        limit = self.ts[-1] - self.retention
+        if self.ts[0] >= limit - self.retention // 8:
+            return
+        idx = bisect_left(self.ts, limit)
+        del self.ts[:idx]
+        for col in self.columns.values():
+            del col[:idx]
+
+    def count(self, start):
+        with self.lock:
+            return len(self.ts) - bisect_left(self.ts, start)
+
+    def history_start(self, now):
+        return now - self.retention
+
+    def query(self, start, end=None):
+        with self.lock:
+            lo = bisect_left(self.ts, start)
+            hi = len(self.ts) if end is None else bisect_right(self.ts, end)
+            return self.ts[lo:hi], {
+                key: col[lo:hi] for key, col in self.columns.items()
+            }
+
+
+def local_offset(ts):
+    # Abstand der Ortszeit zu UTC in Sekunden (inkl. Sommerzeit)
+    return int(datetime.fromtimestamp(ts).astimezone().utcoffset().total_seconds())
+
+
+@functools.lru_cache(maxsize=4096)
+def local_midnight(ts, offset):
+    # Mitternacht Ortszeit vor ts. Am Tag der Zeitumstellung gilt um Mitternacht
+    # ein anderer Abstand zu UTC als zum Messzeitpunkt, daher nachkorrigieren.
+    start = ts - (ts + offset) % (24 * 3600)
+    return start + offset - local_offset(start)
+
+
+@functools.lru_cache(maxsize=4096)
+def local_hour_start(prefix):
+    # "YYYY-MM-DD HH" in Ortszeit → Epoch; pro Stunde nur einmal gerechnet
+    y, m, d, h = int(prefix[:4]), int(prefix[5:7]), int(prefix[8:10]), int(prefix[11:])
+    return int(datetime(y, m, d, h).timestamp())
+
+
+def parse_timestamp(value):
+    # Neue Zeilen enthalten UTC-Epoch, alte "YYYY-MM-DD HH:MM:SS" in Ortszeit
+    if value.isdigit():
+        return int(value)
+    if len(value) != 19:
+        raise ValueError(value)
+    return local_hour_start(value[:13]) + int(value[14:16]) * 60 + int(value[17:])
+
+
+# Spielraum beim Überspringen: alte Ortszeit-Zeilen sind um den Wechsel auf
+# Winterzeit herum nicht streng sortiert
+CSV_SEEK_SLACK = 2 * 3600
+
+
+def csv_seek(f, start):
+    # Zeitlich sortierte Datei: per Bisektion über Byte-Positionen zur ersten
+    # Zeile vor start springen, statt alles davor zu parsen
+    first = lo = f.tell()
+    hi = os.fstat(f.fileno()).st_size
+    start -= CSV_SEEK_SLACK
+    while hi - lo > 65536:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()
+        line = f.readline()
+        try:
+            before = parse_timestamp(line.split(b",", 1)[0].decode()) < start
+        except ValueError:
+            before = False
+        if before:
+            lo = mid
+        else:
+            hi = mid
+    f.seek(lo)
+    # Nur nach einem Bisektionsschritt steht lo mitten in einer Zeile
+    if lo != first:
+        f.readline()
+
+
+def read_csv_rows(path, start=None, end=None):
+    if not os.path.isfile(path):
+        return
+    compressed = path.endswith(".gz")
+    with (gzip.open if compressed else open)(path, "rb") as raw:
+        header = raw.readline().decode().strip().split(",")
+        columns = [(key, header.index(key)) for key in FIELDS if key in header]
+        missing = {key: 0.0 for key in FIELDS if key not in header}
+        if start is not None and not compressed:
+            csv_seek(raw, start)
+        for row in csv.reader(io.TextIOWrapper(raw, newline="")):
+            try:
+                ts = parse_timestamp(row[0])
+                values = {key: float(row[i]) for key, i in columns}
+            except (IndexError, ValueError):
+                ROWS_SKIPPED.inc()
+                continue
+            if start is not None and ts < start:
+                continue
+            if end is not None and ts > end:
+                if ts > end + CSV_SEEK_SLACK:
+                    break
+                continue
+            values.update(missing)
+            yield ts, values
+
+
+def csv_lines(f):
+    # (Zeitstempel, Rohzeile) einer CSV; unlesbare Zeilen behalten ihren Platz
+    ts = -math.inf
+    for line in f:
+        try:
+            ts = parse_timestamp(line.split(b",", 1)[0].decode())
+        except ValueError:
+            pass
+        yield ts, line if line.endswith(b"\n") else line + b"\r\n"
+
+
+def csv_line(header, ts, values):
+    # Neue Zeile passend zur Kopfzeile der Datei, so schreibt csv.writer auch
+    return (
+        ",".join(
+            str(ts) if key == "timestamp" else str(values.get(key, ""))
+            for key in header
+        ).encode()
+        + b"\r\n"
+    )
+
+
+def merge_new(existing, rows):
+    # Bestehende Einträge (ts, roh) unverändert durchreichen und die sortierten
+    # neuen Zeilen davor einsortieren; vorhandene Zeitstempel gewinnen
+    rows = iter(rows)
+    new = next(rows, None)
+    for ts, raw in existing:
+        while new is not None and new[0] < ts:
+            yield new, True
+            new = next(rows, None)
+        if new is not None and new[0] == ts:
+            new = next(rows, None)
+        yield raw, False
+    while new is not None:
+        yield new, True
+        new = next(rows, None)
+
+
+def merge_csv(src, rows, dst):
+    # Alles vor der Leseposition von src unverändert nach dst kopieren, den Rest
+    # mit den neuen Zeilen mischen. Gibt die Zahl neuer Zeilen zurück.
+    pos = src.tell()
+    src.seek(0)
+    header = src.readline().decode().strip().split(",")
+    src.seek(0)
+    while pos:
+        chunk = src.read(min(pos, 1 << 20))
+        if not chunk:
+            break
+        dst.write(chunk)
+        pos -= len(chunk)
+    inserted = 0
+    for item, new in merge_new(csv_lines(src), rows):
+        dst.write(csv_line(header, *item) if new else item)
+        inserted += new
+    return inserted
+
+
+def replace_file(path, write):
+    """Datei über eine Hilfsdatei daneben neu schreiben und erst nach fsync
+    austauschen. Bei vollem Speicher, Absturz oder Stromausfall bleibt das
+    Original vollständig; wer es gerade liest, liest es zu Ende."""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            result = write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # Auch der neue Verzeichniseintrag muss den Stromausfall überstehen
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return result
+
+
+class CsvStorage:
+    """Das bisherige Format: eine fortlaufende wetterdaten.csv ohne Index."""
+
+    name = "csv"
+    filename = DATA_FILE
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _open(self):
+        # Datei einmal offen halten statt bei jedem POST neu zu öffnen
+        if self.file is None:
+            file_exists = os.path.isfile(self.path)
+            self.file = open(self.path, "a", newline="")
+            self.writer = csv.writer(self.file)
+            if not file_exists:
+                self.writer.writerow(["timestamp"] + FIELDS)
+        return self.writer
+
+    def append_many(self, rows):
+        with self.lock:
+            writer = self._open()
+            for ts, values in rows:
+                writer.writerow([ts] + [values[key] for key in FIELDS])
+            self.file.flush()
+            return len(rows)
+
+    def append(self, ts, values):
+        self.append_many([(ts, values)])
+
+    def insert_many(self, rows):
+        # Sortierte Zeilen einsortieren: gemischt wird nur der Rest der Datei ab
+        # der ersten neuen Zeile, ausgetauscht wird die Datei als Ganzes
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if not os.path.isfile(self.path):
+                with open(self.path, "w", newline="") as f:
+                    csv.writer(f).writerow(["timestamp"] + FIELDS)
+            with open(self.path, "rb") as f:
+                f.readline()
+                csv_seek(f, rows[0][0])
+                return replace_file(self.path, lambda dst: merge_csv(f, rows, dst))
+
+    def read(self, start=None, end=None):
+        # Ohne Index: Einstieg per Bisektion, danach sequentiell
+        return read_csv_rows(self.path, start, end)
+
+    def sync(self):
+        with self.lock:
+            if self.file is not None:
+                os.fsync(self.file.fileno())
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class SqliteStorage:
+    """SQLite im WAL-Modus; der Zeitstempel ist Primärschlüssel und damit Index."""
+
+    name = "sqlite"
+    filename = SQLITE_FILE
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{key} REAL" for key in FIELDS)
+        self.db.execute(
+            f"CREATE TABLE IF NOT EXISTS samples (ts INTEGER PRIMARY KEY, {columns})"
+        )
+        self.db.commit()
+        placeholders = ", ".join("?" for _ in FIELDS)
+        self.insert_sql = (
+            f"INSERT OR REPLACE INTO samples (ts, {', '.join(FIELDS)}) "
+            f"VALUES (?, {placeholders})"
+        )
+        self.ignore_sql = self.insert_sql.replace("OR REPLACE", "OR IGNORE")
+        self.select_sql = f"SELECT ts, {', '.join(FIELDS)} FROM samples"
+
+    def append_many(self, rows):
+        with self.lock:
+            self.db.executemany(
+                self.insert_sql,
+                ([ts] + [values[key] for key in FIELDS] for ts, values in rows),
+            )
+            self.db.commit()
+            return len(rows)
+
+    def append(self, ts, values):
+        self.append_many([(ts, values)])
+
+    def insert_many(self, rows):
+        # Vorhandene Zeitstempel bleiben, wie sie sind
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany(
+                self.ignore_sql,
+                ([ts] + [values[key] for key in FIELDS] for ts, values in rows),
+            )
+            self.db.commit()
+            return self.db.total_changes - before
+
+    def read(self, start=None, end=None):
+        sql = self.select_sql + " WHERE ts >= ? AND ts <= ? ORDER BY ts"
+        bounds = (
+            -(2**63) if start is None else start,
+            2**63 - 1 if end is None else end,
+        )
+        # Eigene Verbindung, damit lange Lesevorgänge keine Schreiber blockieren
+        db = sqlite3.connect(self.path)
+        try:
+            for row in db.execute(sql, bounds):
+                yield row[0], dict(zip(FIELDS, row[1:]))
+        finally:
+            db.close()
+
+    def sync(self):
+        # Im WAL-Modus mit synchronous=NORMAL sichert erst der Checkpoint auf Platte
+        with self.lock:
+            self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def size(self):
+        # Datenbank plus noch nicht zurückgeschriebenes WAL
+        paths = [self.path, self.path + "-wal"]
+        return sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class PartitionedStorage:
+    """Eine CSV pro Tag unter data/, gelesen werden nur die betroffenen Tage."""
+
+    name = "daily"
+    filename = PARTITION_DIR
+
+    def __init__(self, path=PARTITION_DIR):
+        self.path = path
+        self.lock = threading.Lock()
+        self.day = None
+        self.file = None
+        self.compact_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.compact()
+
+    def _day(self, ts):
+        return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+    def _writer(self, day):
+        if day != self.day:
+            if self.file is not None:
+                self.file.close()
+                if day > self.day:
+                    # Tageswechsel: alte Tage im Hintergrund aufräumen
+                    threading.Thread(target=self.compact, daemon=True).start()
+            path = os.path.join(self.path, f"{day}.csv")
+            file_exists = os.path.isfile(path)
+            self.file = open(path, "a", newline="")
+            self.writer = csv.writer(self.file)
+            self.day = day
+            if not file_exists:
+                self.writer.writerow(["timestamp"] + FIELDS)
+        return self.writer
+
+    def append_many(self, rows):
+        with self.lock:
+            for ts, values in rows:
+                writer = self._writer(self._day(ts))
+                writer.writerow([ts] + [values[key] for key in FIELDS])
+            if self.file is not None:
+                self.file.flush()
+            return len(rows)
+
+    def append(self, ts, values):
+        self.append_many([(ts, values)])
+
+    def insert_many(self, rows):
+        # Pro Tag einsortieren; neu geschrieben werden nur die betroffenen Tage
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                self.day = None
+            inserted = 0
+            for day, day_rows in itertools.groupby(rows, lambda r: self._day(r[0])):
+                inserted += self._merge_day(day, list(day_rows))
+            return inserted
+
+    def _merge_day(self, day, rows):
+        path = os.path.join(self.path, f"{day}.csv")
+        if os.path.isfile(path + ".gz"):
+            path += ".gz"
+        elif not os.path.isfile(path):
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerow(["timestamp"] + FIELDS)
+        if not path.endswith(".gz"):
+            with open(path, "rb") as f:
+                f.readline()
+                return replace_file(path, lambda dst: merge_csv(f, rows, dst))
+
+        # Komprimierte Tage sind klein: entpacken, mischen, neu packen
+        def write(dst):
+            with gzip.open(dst, "wb") as out:
+                return merge_csv(f, rows, out)
+
+        with gzip.open(path, "rb") as src, tempfile.TemporaryFile() as f:
+            shutil.copyfileobj(src, f)
+            f.seek(0)
+            f.readline()
+            return replace_file(path, write)
+
+    def partitions(self):
+        # Sortierte Liste (Tag, Pfad); komprimierte und offene Tage gemischt
+        result = []
+        for name in os.listdir(self.path):
+            if name.endswith(".csv") or name.endswith(".csv.gz"):
+                result.append((name[:10], os.path.join(self.path, name)))
+        return sorted(result)
+
+    def read(self, start=None, end=None):
+        first = "" if start is None else self._day(start)
+        last = "9999-99-99" if end is None else self._day(end)
+        for day, path in self.partitions():
+            if day < first or day > last:
+                continue
+            yield from read_csv_rows(path, start, end)
+
+    def compact(self):
+        # Läuft höchstens einmal gleichzeitig; der offene Tag bleibt unangetastet
+        if not self.compact_lock.acquire(blocking=False):
+            return
+        try:
+            today = datetime.now().date()
+            for day, path in self.partitions():
+                try:
+                    age = (today - datetime.strptime(day, "%Y-%m-%d").date()).days
+                except ValueError:
+                    continue
+                if day == self.day:
+                    continue
+                if PARTITION_DELETE_DAYS and age > PARTITION_DELETE_DAYS:
+                    os.remove(path)
+                elif age > PARTITION_COMPRESS_DAYS and path.endswith(".csv"):
+                    self._compress(path)
+        finally:
+            self.compact_lock.release()
+
+    def _compress(self, path):
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+
+    def sync(self):
+        with self.lock:
+            if self.file is not None:
+                os.fsync(self.file.fileno())
+
+    def size(self):
+        return sum(os.path.getsize(path) for _, path in self.partitions())
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+# Binärformat: Kopf mit Anzahl gültiger Datensätze, danach feste Datensätze
+# aus Epoch-Zeitstempel (int64) und den Messwerten als float32
+BINARY_MAGIC = b"WETTER\x00\x01"
+BINARY_HEADER = struct.Struct("<8sIIq")
+BINARY_HEADER_SIZE = 32
+BINARY_RECORD = struct.Struct("<q" + "f" * len(FIELDS))
+if np is not None:
+    BINARY_DTYPE = np.dtype([("ts", "<i8")] + [(key, "<f4") for key in FIELDS])
+
+
+class _TimestampColumn:
+    # Sequenz-Sicht auf die Zeitstempel in der Abbildung, damit bisect darauf läuft
+    def __init__(self, buf, count):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        offset = BINARY_HEADER_SIZE + i * BINARY_RECORD.size
+        return struct.unpack_from("<q", self.buf, offset)[0]
+
+
+class BinaryStorage:
+    """Datensätze fester Länge in wetterdaten.bin, gelesen über eine gemeinsame mmap.
+
+    Der Kopf zählt die vollständig geschriebenen Datensätze; halb geschriebene
+    am Ende werden so nie gelesen. Die Datei ist nach Zeit sortiert.
+    """
+
+    name = "binary"
+    filename = BINARY_FILE
+
+    def __init__(self, path=BINARY_FILE, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        if not os.path.isfile(path):
+            # Über eine Hilfsdatei anlegen, damit parallel startende Prozesse
+            # nie eine halbe oder doppelt angelegte Datei sehen
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                header = BINARY_HEADER.pack(
+                    BINARY_MAGIC, 1, BINARY_RECORD.size, 0
+                ).ljust(BINARY_HEADER_SIZE, b"\x00")
+                f.write(header)
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+            os.remove(tmp)
+        self.file = open(path, "rb" if readonly else "r+b")
+        magic, _, record_size, self.count = BINARY_HEADER.unpack(
+            self.file.read(BINARY_HEADER.size)
+        )
+        if magic != BINARY_MAGIC or record_size != BINARY_RECORD.size:
+            raise SystemExit(f"{path} ist keine gültige Wetterdaten-Binärdatei")
+        self.map = None
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.generation = self._generation()
+        self.last_ts = self._ts(self.count - 1) if self.count else None
+
+    def _generation(self):
+        # Zähler hinter dem Kopf, erhöht nach jedem abgeschlossenen Import
+        header = os.pread(self.file.fileno(), 8, BINARY_HEADER.size)
+        return struct.unpack("<q", header)[0]
+
+    def bump_generation(self):
+        # Schreiber: Lese-Prozesse laden daraufhin die Verdichtungen neu
+        with self.lock:
+            self.generation += 1
+            self.file.seek(BINARY_HEADER.size)
+            self.file.write(struct.pack("<q", self.generation))
+            self.file.flush()
+
+    def _mapping(self):
+        # Eine Abbildung für alle Anfragen; nur neu abbilden, wenn die Datei gewachsen ist
+        needed = BINARY_HEADER_SIZE + self.count * BINARY_RECORD.size
+        if self.map is None or len(self.map) < needed:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def _ts(self, i):
+        self.file.seek(BINARY_HEADER_SIZE + i * BINARY_RECORD.size)
+        return struct.unpack("<q", self.file.read(8))[0]
+
+    def append_many(self, rows):
+        # Liefert die Zahl der geschriebenen Zeilen, wie die anderen Backends
+        with self.lock:
+            records = []
+            for ts, values in rows:
+                # Die Datei muss sortiert bleiben, ältere Werte werden verworfen
+                # (nachtragen lassen sie sich per insert_many)
+                if self.last_ts is not None and ts < self.last_ts:
+                    continue
+                records.append(BINARY_RECORD.pack(ts, *(values[k] for k in FIELDS)))
+                self.last_ts = ts
+            if not records:
+                return 0
+            self.file.seek(BINARY_HEADER_SIZE + self.count * BINARY_RECORD.size)
+            self.file.write(b"".join(records))
+            self.file.flush()
+            # Erst danach den Zähler im Kopf erhöhen
+            self.count += len(records)
+            self.file.seek(BINARY_HEADER.size - 8)
+            self.file.write(struct.pack("<q", self.count))
+            self.file.flush()
+            return len(records)
+
+    def append(self, ts, values):
+        self.append_many([(ts, values)])
+
+    def insert_many(self, rows):
+        # Datensätze ab dem ersten neuen Zeitstempel werden mit den neuen gemischt.
+        # Geschrieben wird in eine neue Datei, die erst vollständig und gesichert
+        # die alte ersetzt; Leser behalten bis dahin ihre mmap der alten.
+        with self.lock:
+            buf = self._mapping()
+            lo = bisect_left(_TimestampColumn(buf, self.count), rows[0][0])
+            offset = BINARY_HEADER_SIZE + lo * BINARY_RECORD.size
+            end = BINARY_HEADER_SIZE + self.count * BINARY_RECORD.size
+            existing = (
+                (record[0], BINARY_RECORD.pack(*record))
+                for i in range(offset, end, BINARY_RECORD.size * 10000)
+                for record in BINARY_RECORD.iter_unpack(
+                    buf[i : min(end, i + BINARY_RECORD.size * 10000)]
+                )
+            )
+
+            def write(dst):
+                # Kopf samt Generation übernehmen, der Zähler kommt am Ende
+                dst.write(buf[:BINARY_HEADER_SIZE])
+                for i in range(BINARY_HEADER_SIZE, offset, 1 << 20):
+                    dst.write(buf[i : min(offset, i + (1 << 20))])
+                count, inserted, out = lo, 0, []
+                for item, new in merge_new(existing, rows):
+                    if new:
+                        ts, values = item
+                        item = BINARY_RECORD.pack(ts, *(values[k] for k in FIELDS))
+                    out.append(item)
+                    inserted += new
+                    if len(out) >= 10000:
+                        dst.write(b"".join(out))
+                        count += len(out)
+                        out = []
+                dst.write(b"".join(out))
+                count += len(out)
+                dst.seek(BINARY_HEADER.size - 8)
+                dst.write(struct.pack("<q", count))
+                return count, inserted
+
+            count, inserted = replace_file(self.path, write)
+            self._reopen()
+            return inserted
+
+    def _reopen(self):
+        # Nach dem Austausch der Datei (Import) die neue öffnen und abbilden
+        self.file.close()
+        self.file = open(self.path, "rb" if self.readonly else "r+b")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.map = None
+        header = os.pread(self.file.fileno(), 8, BINARY_HEADER.size - 8)
+        self.count = struct.unpack("<q", header)[0]
+        self.generation = self._generation()
+        self.last_ts = self._ts(self.count - 1) if self.count else None
+
+    def refresh(self):
+        # Leser: Zähler aus dem Kopf übernehmen, den der Schreib-Prozess pflegt.
+        # Er wird erst nach den Datensätzen erhöht, alles darunter ist vollständig.
+        with self.lock:
+            if os.stat(self.path).st_ino != self.inode:
+                # Der Schreiber hat die Datei nach einem Import ausgetauscht
+                self._reopen()
+            header = os.pread(self.file.fileno(), 16, BINARY_HEADER.size - 8)
+            count, self.generation = struct.unpack("<qq", header)
+            if count != self.count:
+                self.count = count
+                self.last_ts = self._ts(count - 1) if count else None
+            return count
+
+    def bounds(self, start=None, end=None):
+        with self.lock:
+            count = self.count
+            if not count:
+                return self._mapping(), 0, 0
+            buf = self._mapping()
+        column = _TimestampColumn(buf, count)
+        lo = 0 if start is None else bisect_left(column, start)
+        hi = count if end is None else bisect_right(column, end)
+        return buf, lo, hi
+
+    def columns(self, start=None, end=None):
+        # Spalten direkt aus der Abbildung, ohne Textparsing und ohne Dict pro Zeile
+        buf, lo, hi = self.bounds(start, end)
+        view = memoryview(buf)[
+            BINARY_HEADER_SIZE
+            + lo * BINARY_RECORD.size : BINARY_HEADER_SIZE
+            + hi * BINARY_RECORD.size
+        ]
+        if np is not None:
+            records = np.frombuffer(view, dtype=BINARY_DTYPE)
+            timestamps = array("q", records["ts"].tobytes())
+            columns = {
+                key: array("d", records[key].astype("<f8").tobytes()) for key in FIELDS
+            }
+            return timestamps, columns
+        unpacked = list(zip(*BINARY_RECORD.iter_unpack(view))) or [()] * (
+            len(FIELDS) + 1
+        )
+        timestamps = array("q", unpacked[0])
+        columns = {key: array("d", col) for key, col in zip(FIELDS, unpacked[1:])}
+        return timestamps, columns
+
+    def read(self, start=None, end=None):
+        return self.records(*self.bounds(start, end))
+
+    def records(self, buf, lo, hi, batch_size=10000):
+        for i in range(lo, hi, batch_size):
+            offset = BINARY_HEADER_SIZE + i * BINARY_RECORD.size
+            length = min(batch_size, hi - i) * BINARY_RECORD.size
+            for record in BINARY_RECORD.iter_unpack(buf[offset : offset + length]):
+                yield record[0], dict(zip(FIELDS, record[1:]))
+
+    def sync(self):
+        with self.lock:
+            os.fsync(self.file.fileno())
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class MappedSampleStore:
+    """SampleStore-Ersatz, der direkt aus der Binärdatei liest statt Kopien zu halten."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @property
+    def seq(self):
+        return self.storage.count
+
+    def __len__(self):
+        return self.storage.count
+
+    def history_start(self, now):
+        # Alles liegt schon in der Abbildung, nichts vorladen
+        return math.inf
+
+    def append(self, ts, values):
+        # Der Wert steht bereits in der Datei
+        pass
+
+    def latest(self):
+        timestamps, columns = self.storage.columns(self.storage.last_ts)
+        if not timestamps:
+            return self.seq, None, None
+        return self.seq, timestamps[-1], {key: columns[key][-1] for key in FIELDS}
+
+    def count(self, start):
+        _, lo, hi = self.storage.bounds(start)
+        return hi - lo
+
+    def query(self, start, end=None):
+        return self.storage.columns(start, end)
+
+
+STORAGES = {
+    "csv": CsvStorage,
+    "sqlite": SqliteStorage,
+    "daily": PartitionedStorage,
+    "binary": BinaryStorage,
+}
+
+
+def open_storage(name=STORAGE_BACKEND, directory="."):
+    if name not in STORAGES:
+        raise SystemExit(f"Unbekanntes Speicher-Backend: {name}")
+    cls = STORAGES[name]
+    return cls(os.path.join(directory, cls.filename))
+
+
+def migrate(source, target, directory=".", batch_size=10000):
+    # Einmalige Übernahme aller Rohwerte von einem Backend in ein anderes
+    src = open_storage(source, directory)
+    dst = open_storage(target, directory)
+    count, batch = 0, []
+    for row in src.read():
+        batch.append(row)
+        if len(batch) >= batch_size:
+            count += dst.append_many(batch)
+            batch = []
+    count += dst.append_many(batch)
+    src.close()
+    dst.close()
+    return count
+
+
+def empty_bucket():
+    bucket = [0]
+    for _ in SCALAR_FIELDS:
+        bucket += [0.0, math.inf, -math.inf]
+    return bucket + [0.0, 0.0]
+
+
+def bucket_add(bucket, values):
+    bucket[0] += 1
+    i = 1
+    for key in SCALAR_FIELDS:
+        v = values[key]
+        bucket[i] += v
+        if v < bucket[i + 1]:
+            bucket[i + 1] = v
+        if v > bucket[i + 2]:
+            bucket[i + 2] = v
+        i += 3
+    r = math.radians(values["winddir"])
+    bucket[i] += math.cos(r)
+    bucket[i + 1] += math.sin(r)
+
+
+def rollup_buckets_numpy(ts, columns, width, offsets):
+    # Alle Buckets einer Stufe auf einmal per reduceat, Zeilen wie empty_bucket()
+    if not len(ts):
+        return [], []
+    buckets = ts - (ts + offsets) % width
+    if width == 24 * 3600:
+        # Wie RollupTier.bucket_start: Mitternacht mit dem dort gültigen Abstand
+        days, inverse = np.unique(buckets, return_inverse=True)
+        buckets = (
+            buckets + offsets - np.array([local_offset(int(d)) for d in days])[inverse]
+        )
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    parts = [np.diff(np.r_[starts, len(ts)])]
+    for key in SCALAR_FIELDS:
+        col = columns[key]
+        parts += [
+            np.add.reduceat(col, starts),
+            np.minimum.reduceat(col, starts),
+            np.maximum.reduceat(col, starts),
+        ]
+    rad = np.radians(columns["winddir"])
+    parts += [
+        np.add.reduceat(np.cos(rad), starts),
+        np.add.reduceat(np.sin(rad), starts),
+    ]
+    rows = np.column_stack(parts).tolist()
+    for row in rows:
+        row[0] = int(row[0])
+    return buckets[starts].tolist(), rows
+
+
+def bucket_merge(bucket, other):
+    bucket[0] += other[0]
+    i = 1
+    for _ in SCALAR_FIELDS:
+        bucket[i] += other[i]
+        bucket[i + 1] = min(bucket[i + 1], other[i + 1])
+        bucket[i + 2] = max(bucket[i + 2], other[i + 2])
+        i += 3
+    bucket[i] += other[i]
+    bucket[i + 1] += other[i + 1]
+
+
+class RollupTier:
+    """Eine Verdichtungsstufe: geschlossene Buckets im Speicher und in einer eigenen CSV."""
+
+    def __init__(self, width, retention, directory=ROLLUP_DIR, readonly=False):
+        self.width = width
+        self.retention = retention
+        self.directory = directory
+        # Lese-Prozesse halten die Stufen nur im Speicher, geschrieben wird vom Schreiber
+        self.readonly = readonly
+        self.path = os.path.join(directory, f"rollup_{width}.csv")
+        self.ts = array("q")
+        self.rows = []
+        self.current = None
+        self.current_start = None
+        # Buckets vor diesem Zeitpunkt sind schon gespeichert
+        self.resume_after = -math.inf
+        # Ältere Buckets fallen ohnehin unter die Aufbewahrung
+        self.floor = -math.inf
+
+    def covers(self, span):
+        return self.retention is None or self.retention >= span
+
+    def bucket_start(self, ts, offset):
+        # Tagesbuckets an Mitternacht Ortszeit ausrichten
+        if self.width == 24 * 3600:
+            return local_midnight(ts - (ts + offset) % 3600, offset)
+        return ts - (ts + offset) % self.width
+
+    def next_start(self, start):
+        # Beginn des folgenden Buckets; Tage haben 23 bis 25 Stunden
+        if self.width != 24 * 3600:
+            return start + self.width
+        ts = start + 36 * 3600
+        return self.bucket_start(ts, local_offset(ts))
+
+    def load(self, now):
+        limit = -math.inf if self.retention is None else now - self.retention
+        self.floor = limit
+        if not os.path.isfile(self.path):
+            return
+        dropped = False
+        with open(self.path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                try:
+                    ts = int(row[0])
+                    values = [int(row[1])] + [float(v) for v in row[2:]]
+                except (IndexError, ValueError):
+                    dropped = True
+                    continue
+                if ts < limit or len(values) != len(ROLLUP_COLUMNS):
+                    dropped = True
+                    continue
+                self.ts.append(ts)
+                self.rows.append(values)
+        if self.ts:
+            self.resume_after = self.next_start(self.ts[-1])
+        if dropped:
+            # Datei kompaktieren: nur noch die aufbewahrten Buckets behalten
+            self._rewrite()
+
+    def add(self, ts, values, offset):
+        start = self.bucket_start(ts, offset)
+        if start < self.resume_after:
+            return
+        if self.current is not None and start != self.current_start:
+            if start < self.current_start:
+                # Verspäteter Wert für einen bereits geschlossenen Bucket
+                return
+            self._close()
+        if self.current is None:
+            self.current = empty_bucket()
+            self.current_start = start
+        bucket_add(self.current, values)
+
+    def add_bucket(self, start, bucket):
+        # Wie add(), aber mit einem schon verdichteten Bucket
+        if start < self.resume_after:
+            return
+        if self.current is not None and start != self.current_start:
+            if start < self.current_start:
+                return
+            self._close()
+        if self.current is None:
+            self.current = bucket
+            self.current_start = start
+        else:
+            bucket_merge(self.current, bucket)
+
+    def _close(self):
+        if self.current_start < self.floor:
+            # Beim ersten Aufbau aus alter Historie nichts Unnötiges speichern
+            self.current = None
+            self.current_start = None
+            return
+        self.ts.append(self.current_start)
+        self.rows.append(self.current)
+        self._persist(self.current_start, self.current)
+        self.resume_after = self.next_start(self.current_start)
+        self.current = None
+        self.current_start = None
+        if self.retention is not None:
+            limit = self.ts[-1] - self.retention
+            if self.ts[0] < limit - self.retention // 8:
+                idx = bisect_left(self.ts, limit)
+                del self.ts[:idx]
+                del self.rows[:idx]
+
+    def _persist(self, ts, bucket):
+        if self.readonly:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        file_exists = os.path.isfile(self.path)
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(["timestamp"] + ROLLUP_COLUMNS)
+            writer.writerow([ts] + [round(v, 4) for v in bucket])
+
+    def _rewrite(self):
+        if self.readonly:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp"] + ROLLUP_COLUMNS)
+            for ts, bucket in zip(self.ts, self.rows):
+                writer.writerow([ts] + [round(v, 4) for v in bucket])
+        os.replace(tmp, self.path)
+
+    def merge_bucket(self, start, bucket):
+        # Import: Bucket in die vorhandenen einmischen, nichts wird verworfen.
+        # Gibt True zurück, wenn gespeicherte Buckets neu geschrieben werden müssen.
+        if start < self.floor:
+            return False
+        if (
+            start >= self.current_start
+            if self.current is not None
+            else start >= self.resume_after
+        ):
+            self.add_bucket(start, bucket)
+            return False
+        idx = bisect_left(self.ts, start)
+        if idx < len(self.ts) and self.ts[idx] == start:
+            bucket_merge(self.rows[idx], bucket)
+        else:
+            self.ts.insert(idx, start)
+            self.rows.insert(idx, bucket)
+        return True
+
+    def query(self, start):
+        lo = bisect_left(self.ts, start)
+        timestamps = self.ts[lo:].tolist()
+        rows = self.rows[lo:]
+        if self.current is not None and self.current_start >= start:
+            # Den noch offenen Bucket mitliefern, damit die Daten aktuell sind
+            timestamps.append(self.current_start)
+            rows.append(list(self.current))
+        return timestamps, rows
+
+
+class Rollups:
+    def __init__(self, directory=ROLLUP_DIR, tiers=ROLLUP_TIERS, readonly=False):
+        self.tiers = [
+            RollupTier(width, retention, directory, readonly)
+            for width, retention in tiers
+        ]
+        self.lock = threading.Lock()
+
+    def load(self):
+        now = int(datetime.now().timestamp())
+        for tier in self.tiers:
+            tier.load(now)
+
+    def add(self, ts, values):
+        offset = local_offset(ts)
+        with self.lock:
+            for tier in self.tiers:
+                tier.add(ts, values, offset)
+
+    def merge_many(self, timestamps, columns):
+        # Nachgelieferte Werte (Import) in vorhandene Buckets einmischen; die
+        # Rohdaten dazu müssen nicht mehr auf der Karte liegen
+        with self.lock:
+            for tier, buckets in self._buckets(timestamps, columns):
+                changed = False
+                for start, bucket in buckets:
+                    changed |= tier.merge_bucket(start, bucket)
+                if changed:
+                    tier._rewrite()
+
+    def _buckets(self, timestamps, columns):
+        # (Stufe, [(Start, Bucket), ...]) für sortierte Werte
+        if not timestamps:
+            return
+        if np is None:
+            offsets = [local_offset(ts) for ts in timestamps]
+            for tier in self.tiers:
+                buckets = {}
+                for i, ts in enumerate(timestamps):
+                    start = tier.bucket_start(ts, offsets[i])
+                    if start not in buckets:
+                        buckets[start] = empty_bucket()
+                    bucket_add(buckets[start], {key: columns[key][i] for key in FIELDS})
+                yield tier, list(buckets.items())
+            return
+        ts = np.asarray(timestamps, dtype=np.int64)
+        columns = {key: np.asarray(columns[key], dtype=np.float64) for key in FIELDS}
+        # Der Abstand zur Ortszeit ändert sich höchstens zur vollen Stunde
+        hours, inverse = np.unique(ts // 3600, return_inverse=True)
+        offsets = np.array([local_offset(int(h) * 3600) for h in hours])[inverse]
+        for tier in self.tiers:
+            # Was vor der Aufbewahrung liegt, gar nicht erst verdichten
+            lo = 0 if tier.floor == -math.inf else np.searchsorted(ts, tier.floor)
+            starts, rows = rollup_buckets_numpy(
+                ts[lo:],
+                {key: col[lo:] for key, col in columns.items()},
+                tier.width,
+                offsets[lo:],
+            )
+            yield tier, list(zip(starts, rows))
+
+    def pick(self, span, resolution=None):
+        # Gröbste Stufe, die noch fein genug ist und den ganzen Zeitraum abdeckt
+        covering = [tier for tier in self.tiers if tier.covers(span)]
+        fine = [tier for tier in covering if resolution and tier.width <= resolution]
+        if fine:
+            return fine[-1]
+        if span > STORE_RETENTION and covering:
+            return covering[0]
+        return None
+
+    def query(self, tier, start, resolution):
+        with self.lock:
+            timestamps, rows = tier.query(start)
+        return rollup_result(timestamps, rows, max(resolution or 0, tier.width))
+
+
+class LiveFeed:
+    """Verteilt jeden neuen Messwert an alle offenen SSE-Verbindungen.
+
+    Es gibt nur einen gemeinsamen Slot mit der letzten Nachricht: publish()
+    serialisiert einmal und weckt alle Wartenden, ohne Warteschlange pro Client.
+    """
+
+    def __init__(self, max_clients=SSE_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self.clients = 0
+        self.seq = 0
+        self.message = None
+        self.cond = threading.Condition()
+
+    def subscribe(self):
+        with self.cond:
+            if self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def unsubscribe(self):
+        with self.cond:
+            self.clients -= 1
+
+    def publish(self, message):
+        with self.cond:
+            self.seq += 1
+            self.message = message
+            self.cond.notify_all()
+
+    def wait(self, seq, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.seq, self.message
+
+
+class DebugLog:
+    """Begrenztes Debug-Log. Einträge entstehen im Request-Thread als Dict,
+    serialisiert und geschrieben wird im Hintergrund."""
+
+    def __init__(self, path=LOG_FILE, level=LOG_LEVEL, sample=LOG_SAMPLE):
+        if level not in LOG_LEVELS:
+            raise SystemExit(f"Unbekannte Log-Stufe: {level}")
+        self.path = path
+        self.level = LOG_LEVELS[level]
+        self.sample = max(1, sample)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.opened = None
+
+    def sampled(self):
+        # Billige Entscheidung vor dem Kopieren der Nutzlast
+        if self.level >= LOG_LEVELS["debug"]:
+            return True
+        return (
+            self.level >= LOG_LEVELS["info"] and next(self.counter) % self.sample == 0
+        )
+
+    def record(self, level, event, station, form=None, **extra):
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "level": level,
+            "event": event,
+            "station": station,
+        }
+        if form is not None:
+            entry["form"] = {
+                key: "***" if key.upper() in REDACTED_FIELDS else value
+                for key, value in form.items()
+            }
+        entry.update(extra)
+        return entry
+
+    def write(self, records):
+        lines = [
+            json.dumps(entry, ensure_ascii=False) + "\n"
+            for entry in records
+            if LOG_LEVELS[entry["level"]] <= self.level
+        ]
+        if not lines:
+            return
+        with self.lock:
+            if self._due():
+                self._rotate()
+            if self.opened is None:
+                self.opened = time.time()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def _due(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            self.opened = None
+            return False
+        if self.opened is None:
+            # Nach dem Start: Alter aus dem ersten Eintrag. Alte Logs ohne
+            # JSON-Zeilen (unbegrenztes Format) werden sofort weggeräumt.
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    first = json.loads(f.readline())
+                self.opened = datetime.fromisoformat(first["time"]).timestamp()
+            except (ValueError, KeyError, TypeError):
+                return True
+        return size >= LOG_MAX_BYTES or time.time() - self.opened >= LOG_MAX_AGE
+
+    def _rotate(self):
+        # debug_post.log → .1.gz → .2.gz … das älteste fällt weg
+        suffix = ".gz" if LOG_COMPRESS else ""
+        backups = [f"{self.path}.{i}{suffix}" for i in range(1, LOG_BACKUPS + 1)]
+        if not backups:
+            os.remove(self.path)
+        else:
+            for src, dst in reversed(list(zip(backups, backups[1:]))):
+                if os.path.exists(src):
+                    os.replace(src, dst)
+            if LOG_COMPRESS:
+                with open(self.path, "rb") as src, gzip.open(
+                    backups[0] + ".tmp", "wb"
+                ) as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(backups[0] + ".tmp", backups[0])
+                os.remove(self.path)
+            else:
+                os.replace(self.path, backups[0])
+        self.opened = None
+
+
+debug_log = DebugLog()
+
+
+class SlidingWindow:
+    """Summe, Mittel, Minimum oder Maximum der letzten span Sekunden.
+
+    Jeder Messwert wird genau einmal eingefügt und einmal entfernt: Summe und
+    Mittel führen eine laufende Summe, Min/Max eine monotone Warteschlange, in
+    der nur Werte bleiben, die noch Extremwert werden können.
+    """
+
+    def __init__(self, span, agg):
+        self.span = span
+        self.agg = agg
+        self.items = deque()
+        self.total = 0.0
+
+    def add(self, ts, value):
+        items = self.items
+        if self.agg in ("sum", "avg"):
+            self.total += value
+        elif self.agg == "max":
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((ts, value))
+        # Was aus dem Fenster fällt, vorne abnehmen
+        while items[0][0] <= ts - self.span:
+            _, old = items.popleft()
+            if self.agg in ("sum", "avg"):
+                self.total -= old
+
+    def value(self):
+        if self.agg == "sum":
+            return self.total
+        if self.agg == "avg":
+            return self.total / len(self.items)
+        return self.items[0][1]
+
+
+class AlertRule:
+    """Zustand einer Warnregel für eine Station, wird pro Messwert fortgeschrieben.
+
+    Ausgelöst wird, wenn der (über das Fenster verdichtete) Wert die Schwelle
+    "hold" Sekunden lang ununterbrochen überschreitet, aufgehoben erst, wenn er
+    die Aufhebeschwelle erreicht. So flattert die Warnung nicht um die Grenze.
+    """
+
+    def __init__(self, name, field, op, threshold, clear, agg=None, over=0, hold=0):
+        self.name = name
+        self.field = field
+        self.op = op
+        self.threshold = threshold
+        self.clear = clear
+        self.agg = agg
+        self.hold = hold
+        self.window = SlidingWindow(over, agg) if agg else None
+        self.lookback = over + hold
+        self.value = None
+        self.active = False
+        self.since = None
+
+    def exceeds(self, value, limit):
+        return value > limit if self.op == ">" else value < limit
+
+    def update(self, ts, values):
+        value = values[self.field]
+        if self.window is not None:
+            self.window.add(ts, value)
+            value = self.window.value()
+        self.value = value
+        if self.active:
+            if not self.exceeds(value, self.clear):
+                self.active = False
+                self.since = None
+                return "cleared"
+            return None
+        if not self.exceeds(value, self.threshold):
+            self.since = None
+            return None
+        if self.since is None:
+            self.since = ts
+        if ts - self.since >= self.hold:
+            self.active = True
+            return "raised"
+        return None
+
+    def status(self):
+        return {
+            "name": self.name,
+            "field": self.field,
+            "agg": self.agg,
+            "op": self.op,
+            "threshold": self.threshold,
+            "clear": self.clear,
+            "value": self.value,
+            "active": self.active,
+            "since": self.since,
+        }
+
+
+class AlertEngine:
+    """Alle Warnregeln einer Station; wertet neue Messwerte inkrementell aus."""
+
+    def __init__(self, station_id, rules=ALERT_RULES):
+        self.station_id = station_id
+        self.rules = [
+            AlertRule(
+                rule["name"],
+                rule["field"],
+                rule["op"],
+                rule["threshold"],
+                rule["clear"],
+                rule["agg"],
+                rule["over"],
+                rule["hold"],
+            )
+            for rule in rules
+            if rule["station"] in (None, station_id)
+        ]
+        # So weit zurück muss beim Start gelesen werden, damit Fenster voll sind
+        self.lookback = max([ALERT_RESUME] + [rule.lookback for rule in self.rules])
+
+    def evaluate(self, samples):
+        events = []
+        if not self.rules:
+            return events
+        for ts, values in samples:
+            for rule in self.rules:
+                state = rule.update(ts, values)
+                if state is not None:
+                    events.append(
+                        {
+                            "time": datetime.fromtimestamp(ts).isoformat(
+                                timespec="seconds"
+                            ),
+                            "epoch": ts,
+                            "station": self.station_id,
+                            "rule": rule.name,
+                            "state": state,
+                            "field": rule.field,
+                            "value": rule.value,
+                            "threshold": rule.threshold,
+                        }
+                    )
+        return events
+
+    def active(self):
+        return [
+            {"name": rule.name, "value": rule.value, "since": rule.since}
+            for rule in self.rules
+            if rule.active
+        ]
+
+
+class AlertNotifier:
+    """Schreibt Warnungen im Hintergrund ins Alarm-Log und an den Webhook,
+    damit ein langsamer Empfänger das Schreiben der Messwerte nicht aufhält."""
+
+    def __init__(self, path=ALERT_LOG, webhook=ALERT_WEBHOOK):
+        self.path = path
+        self.webhook = webhook
+        self.queue = queue.Queue(1000)
+        self.thread = None
+
+    def notify(self, events):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="alert-notifier", daemon=True
+            )
+            self.thread.start()
+        for event in events:
+            ALERTS.inc(
+                station=event["station"], rule=event["rule"], state=event["state"]
+            )
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            line = json.dumps(event, ensure_ascii=False)
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                if self.webhook:
+                    post = urllib.request.Request(
+                        self.webhook,
+                        data=line.encode(),
+                        headers={"Content-Type": "application/json"},
+                    )
+                    with urllib.request.urlopen(post, timeout=ALERT_TIMEOUT):
+                        pass
+            except (OSError, ValueError) as e:
+                try:
+                    debug_log.write(
+                        [
+                            debug_log.record(
+                                "error", "alert_error", event["station"], error=str(e)
+                            )
+                        ]
+                    )
+                except OSError:
+                    pass
+
+
+alert_notifier = AlertNotifier()
+
+
+class IngestPipeline:
+    """Nimmt geprüfte Messwerte entgegen und schreibt sie gebündelt im Hintergrund.
+
+    Der Request wartet nur auf das Einreihen. Der Schreib-Thread nimmt alles mit,
+    was sich während des letzten Schreibvorgangs angesammelt hat (Group Commit),
+    und aktualisiert danach Ringpuffer, Verdichtungen und Live-Stream.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self, station, maxsize=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE
+    ):
+        self.station = station
+        self.queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.thread = None
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name=f"ingest-{self.station.id}", daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        # Beim Beenden alles Eingereihte noch schreiben
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(self._STOP)
+        self.thread.join()
+
+    def submit(self, ts, values):
+        # Ohne laufenden Schreib-Thread würde nichts mehr geschrieben: ablehnen
+        if self.thread is None or not self.thread.is_alive():
+            return False
+        try:
+            self.queue.put(("sample", ts, values), timeout=1)
+        except queue.Full:
+            return False
+        return True
+
+    def log(self, entry):
+        try:
+            self.queue.put_nowait(("log", entry))
+        except queue.Full:
+            pass
+
+    def wait(self):
+        # Blockiert, bis alles Eingereihte verarbeitet ist (für Tests und Benchmarks)
+        self.queue.join()
+
+    def backlog(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=FSYNC_INTERVAL)
+            except queue.Empty:
+                try:
+                    self._sync(force=True)
+                except OSError as e:
+                    self._failed("sync_error", e)
+                continue
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._STOP in batch
+            try:
+                # Schreiben und Veröffentlichen am Stück, ein Import baut sonst dazwischen um
+                with self.station.lock:
+                    self._flush([item for item in batch if item is not self._STOP])
+            except Exception as e:
+                # z. B. volle Karte beim Sichern der Verdichtungen: der Thread muss
+                # weiterlaufen, sonst stauen sich alle folgenden Messwerte
+                self._failed("flush_error", e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                self._sync(force=True)
+                return
+
+    def _failed(self, event, error):
+        try:
+            debug_log.write(
+                [debug_log.record("error", event, self.station.id, error=str(error))]
+            )
+        except OSError:
+            pass
+
+    def _flush(self, batch):
+        records = [item[1] for item in batch if item[0] == "log"]
+        samples = [(item[1], item[2]) for item in batch if item[0] == "sample"]
+        if samples:
+            t0 = time.perf_counter()
+            try:
+                accepted = self.station.storage.append_many(samples)
+                self.dirty = True
+                self._sync()
+            except Exception as e:
+                records.append(
+                    debug_log.record(
+                        "error", "write_error", self.station.id, error=str(e)
+                    )
+                )
+                samples = []
+            else:
+                INGEST_SECONDS.observe(time.perf_counter() - t0)
+                SAMPLES_INGESTED.inc(accepted, station=self.station.id)
+                dropped = len(samples) - accepted
+                if dropped:
+                    # Binärformat: Zeitstempel vor dem letzten gespeicherten
+                    SAMPLES_DROPPED.inc(dropped, station=self.station.id)
+                    records.append(
+                        debug_log.record(
+                            "error", "out_of_order", self.station.id, dropped=dropped
+                        )
+                    )
+        if records:
+            try:
+                debug_log.write(records)
+            except OSError:
+                # Ein Problem mit dem Log darf die Messwerte nicht aufhalten
+                pass
+        self.station.publish(samples)
+
+    def _sync(self, force=False):
+        if not self.dirty or FSYNC_POLICY == "never":
+            return
+        now = time.monotonic()
+        if FSYNC_POLICY == "always" or force or now - self.last_sync >= FSYNC_INTERVAL:
+            self.station.storage.sync()
+            self.dirty = False
+            self.last_sync = now
+
+
+class IngestForwarder:
+    """Ersatz für IngestPipeline in Lese-Prozessen: reicht Messwerte und
+    Log-Einträge per Unix-Socket an den Schreib-Prozess weiter."""
+
+    sock = None
+
+    def __init__(self, station):
+        self.station = station
+
+    def start(self):
+        if IngestForwarder.sock is None:
+            IngestForwarder.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def stop(self):
+        pass
+
+    def _send(self, message):
+        message["station"] = self.station.id
+        try:
+            self.sock.sendto(json.dumps(message).encode(), INGEST_SOCKET)
+        except OSError:
+            # Kein Schreib-Prozess erreichbar
+            return False
+        return True
+
+    def submit(self, ts, values):
+        return self._send({"sample": [ts, values]})
+
+    def log(self, entry):
+        self._send({"log": entry})
+
+    def wait(self):
+        pass
+
+    def backlog(self):
+        return 0
+
+
+def listen_for_readers():
+    # Schreib-Prozess: weitergereichte Messwerte in die eigenen Warteschlangen
+    if os.path.exists(INGEST_SOCKET):
+        os.remove(INGEST_SOCKET)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(INGEST_SOCKET)
+
+    def run():
+        while True:
+            data = sock.recv(65536)
+            try:
+                message = json.loads(data)
+                station = stations[message["station"]]
+            except (ValueError, KeyError):
+                continue
+            if "sample" in message:
+                ts, values = message["sample"]
+                if not station.ingest.submit(ts, values):
+                    SAMPLES_REJECTED.inc(station=station.id)
+            elif "log" in message:
+                station.ingest.log(message["log"])
+
+    threading.Thread(target=run, name="ingest-listener", daemon=True).start()
+
+
+class Station:
+    """Alles, was zu einem Gateway gehört: Speicher, Ringpuffer, Verdichtungen,
+    Live-Stream und eigener Schreib-Thread, damit Stationen sich nicht bremsen."""
+
+    def __init__(self, station_id):
+        self.id = station_id
+        if station_id == DEFAULT_STATION:
+            # Die Standardstation bleibt bei den bisherigen Dateien im Projektordner
+            self.directory = "."
+        else:
+            self.directory = os.path.join(STATIONS_DIR, station_id)
+            os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+        reader = ROLE == "reader"
+        if reader:
+            self.storage = BinaryStorage(
+                os.path.join(self.directory, BINARY_FILE), readonly=True
+            )
+        else:
+            self.storage = open_storage(directory=self.directory)
+        # Beim Binärformat wird direkt aus der Datei gelesen, sonst aus dem Ringpuffer
+        if isinstance(self.storage, BinaryStorage):
+            self.store = MappedSampleStore(self.storage)
+        else:
+            self.store = SampleStore()
+        self.feed = LiveFeed()
+        self.rollups = Rollups(
+            os.path.join(self.directory, ROLLUP_DIR), readonly=reader
+        )
+        self.alerts = AlertEngine(station_id)
+        self.load_history()
+        self.ingest = IngestForwarder(self) if reader else IngestPipeline(self)
+        self.ingest.start()
+        if reader:
+            threading.Thread(
+                target=self._follow, name=f"follow-{station_id}", daemon=True
+            ).start()
+
+    def load_history(self):
+        # Nur so weit zurück lesen, wie Speicher und Verdichtungen es brauchen
+        self.rollups.load()
+        now = int(datetime.now().timestamp())
+        start = min(
+            [self.store.history_start(now)]
+            + [t.resume_after for t in self.rollups.tiers]
+        )
+        # Fenster der Warnregeln füllen; was schon vor dem Start galt, gilt
+        # weiter, ohne erneut gemeldet zu werden
+        if self.alerts.rules:
+            self.alerts.evaluate(self.storage.read(now - self.alerts.lookback))
+        if start == math.inf:
+            return
+        for ts, values in self.storage.read(None if start == -math.inf else start):
+            self.store.append(ts, values)
+            self.rollups.add(ts, values)
+
+    def publish(self, samples):
+        # Neue Messwerte an Ringpuffer, Verdichtungen, Cache und Live-Stream
+        for ts, values in samples:
+            self.store.append(ts, values)
+            self.rollups.add(ts, values)
+        events = self.alerts.evaluate(samples)
+        # Melden nur der Schreiber, Lese-Prozesse werten nur für ihre Seiten aus
+        if events and ROLE != "reader":
+            alert_notifier.notify(events)
+        if samples:
+            data_cache.invalidate(self.id)
+            ts, values = samples[-1]
+            self.feed.publish(
+                json.dumps(latest_payload(ts, values, self.alerts.active()))
+            )
+
+    def import_rows(self, rows):
+        """Nachträglich gelieferte Messwerte blockweise sortiert und ohne doppelte
+        Zeitstempel einsortieren; None steht für eine unlesbare Zeile."""
+        stats = {"received": 0, "inserted": 0, "duplicates": 0, "skipped": 0}
+        rows = iter(rows)
+        try:
+            while chunk := list(itertools.islice(rows, IMPORT_BATCH)):
+                batch = {}
+                for row in chunk:
+                    if row is None:
+                        stats["skipped"] += 1
+                    else:
+                        batch.setdefault(row[0], row[1])
+                stats["received"] += len(chunk)
+                if not batch:
+                    continue
+                # Nur wirklich neue Zeitstempel, sonst zählten die Verdichtungen doppelt
+                known = {ts for ts, _ in self.storage.read(min(batch), max(batch))}
+                batch = sorted(item for item in batch.items() if item[0] not in known)
+                if not batch:
+                    continue
+                inserted = self.storage.insert_many(batch)
+                stats["inserted"] += inserted
+                SAMPLES_INGESTED.inc(inserted, station=self.id)
+                self.merge(batch)
+        except ValueError as e:
+            # Rest der Datei unlesbar (z. B. Kodierung): bereits geschriebene
+            # Blöcke bleiben, die Antwort nennt den Fehler samt Zählern
+            stats["error"] = str(e)
+        finally:
+            stats["duplicates"] = (
+                stats["received"] - stats["skipped"] - stats["inserted"]
+            )
+        return stats
+
+    def merge(self, rows):
+        # Importierte Werte in Verdichtungen und Ringpuffer übernehmen, ohne
+        # vorhandene Buckets zu verwerfen
+        with self.lock:
+            self.rollups.merge_many(
+                [ts for ts, _ in rows],
+                {key: [values[key] for _, values in rows] for key in FIELDS},
+            )
+            if isinstance(self.store, SampleStore):
+                history = self.store.history_start(int(datetime.now().timestamp()))
+                if rows[-1][0] >= history:
+                    # Der Ringpuffer ist nur anhängbar: aus dem Speicher neu füllen
+                    store = SampleStore()
+                    for ts, values in self.storage.read(history):
+                        store.append(ts, values)
+                    self.store = store
+            data_cache.invalidate(self.id)
+            if isinstance(self.storage, BinaryStorage):
+                # Lese-Prozessen melden, dass sie die Verdichtungen neu laden sollen
+                self.storage.bump_generation()
+
+    def reload(self):
+        # Lese-Prozess nach einem Import im Schreiber: dessen Verdichtungen neu
+        # laden und den noch offenen Rest aus der Binärdatei nachziehen
+        rollups = Rollups(os.path.join(self.directory, ROLLUP_DIR), readonly=True)
+        rollups.load()
+        start = min(tier.resume_after for tier in rollups.tiers)
+        if start != math.inf:
+            for ts, values in self.storage.read(None if start == -math.inf else start):
+                rollups.add(ts, values)
+        self.rollups = rollups
+        data_cache.invalidate(self.id)
+
+    def _follow(self):
+        # Lese-Prozess: was der Schreiber angehängt hat, nachziehen
+        seen, inode = self.storage.count, self.storage.inode
+        generation = self.storage.generation
+        while True:
+            time.sleep(FOLLOW_INTERVAL)
+            count = self.storage.refresh()
+            if self.storage.generation != generation:
+                # Import abgeschlossen: Verdichtungen des Schreibers übernehmen
+                seen, inode = count, self.storage.inode
+                generation = self.storage.generation
+                self.reload()
+            elif self.storage.inode != inode:
+                # Nach einem Import sind die Datensätze verschoben, nicht angehängt
+                seen, inode = count, self.storage.inode
+            elif count > seen:
+                buf, _, _ = self.storage.bounds()
+                self.publish(list(self.storage.records(buf, seen, count)))
+                seen = count
+
+
+def get_station():
+    station = stations.get(request.args.get("station", DEFAULT_STATION))
+    if station is None:
+        abort(404)
+    return station
+
+
+# Ohne Passkeys trotzdem die Standardstation laden, damit vorhandene Daten lesbar sind
+stations = {
+    station_id: Station(station_id)
+    for station_id in dict.fromkeys([DEFAULT_STATION, *PASSKEYS.values()])
+}
+if ROLE == "writer":
+    listen_for_readers()
+
+
+def circular_mean(degrees):
+    # Windrichtung über Einheitsvektoren mitteln (350° und 10° ergeben 0°, nicht 180°)
+    x = sum(math.cos(math.radians(d)) for d in degrees)
+    y = sum(math.sin(math.radians(d)) for d in degrees)
+    if x == 0 and y == 0:
+        return 0.0
+    return round(math.degrees(math.atan2(y, x)), 6) % 360
+
+
+def downsample(timestamps, columns, resolution):
+    # Fasst die Werte in Buckets zu je `resolution` Sekunden zusammen (min/mittel/max)
+    if np is not None and len(timestamps):
+        return downsample_numpy(timestamps, columns, resolution)
+    result = {"timestamps": [], "min": {}, "max": {}}
+    for key in FIELDS:
+        result[key] = []
+        if key != "winddir":
+            result["min"][key] = []
+            result["max"][key] = []
+
+    i, n = 0, len(timestamps)
+    while i < n:
+        bucket = timestamps[i] - timestamps[i] % resolution
+        j = bisect_left(timestamps, bucket + resolution, i)
+        result["timestamps"].append(bucket)
+        for key in FIELDS:
+            seg = columns[key][i:j]
+            if key == "winddir":
+                result[key].append(circular_mean(seg))
+                continue
+            result[key].append(sum(seg) / len(seg))
+            result["min"][key].append(min(seg))
+            result["max"][key].append(max(seg))
+        i = j
+    return result
+
+
+def downsample_numpy(timestamps, columns, resolution):
+    # Wie downsample(), aber alle Buckets einer Spalte auf einmal per reduceat
+    ts = np.asarray(timestamps, dtype=np.int64)
+    buckets = ts - ts % resolution
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(ts)])
+    result = {"timestamps": buckets[starts].tolist(), "min": {}, "max": {}}
+    for key in FIELDS:
+        col = np.asarray(columns[key], dtype=np.float64)
+        if key == "winddir":
+            rad = np.radians(col)
+            x = np.add.reduceat(np.cos(rad), starts)
+            y = np.add.reduceat(np.sin(rad), starts)
+            mean = np.round(np.degrees(np.arctan2(y, x)), 6) % 360
+            result[key] = np.where((x == 0) & (y == 0), 0.0, mean).tolist()
+            continue
+        result[key] = (np.add.reduceat(col, starts) / counts).tolist()
+        result["min"][key] = np.minimum.reduceat(col, starts).tolist()
+        result["max"][key] = np.maximum.reduceat(col, starts).tolist()
+    return result
+
+
+def dew_point(t, rh, log=math.log):
+    # Magnus-Formel; t in °C, rh in %
+    gamma = log(rh / 100) + 17.62 * t / (243.12 + t)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+def heat_index(t, rh):
+    # Rothfusz-Regression (NOAA) in °F, sinnvoll ab etwa 27 °C
+    f = t * 1.8 + 32
+    hi = (
+        -42.379
+        + 2.04901523 * f
+        + 10.14333127 * rh
+        - 0.22475541 * f * rh
+        - 6.83783e-3 * f * f
+        - 5.481717e-2 * rh * rh
+        + 1.22874e-3 * f * f * rh
+        + 8.5282e-4 * f * rh * rh
+        - 1.99e-6 * f * f * rh * rh
+    )
+    return (hi - 32) / 1.8
+
+
+def wind_chill(t, v):
+    # Windchill nach JAG/TI; t in °C, v in km/h, gilt bis 10 °C und ab 4,8 km/h
+    vp = v**0.16
+    return 13.12 + 0.6215 * t - 11.37 * vp + 0.3965 * t * vp
+
+
+def derived_series(timestamps, columns):
+    """Taupunkt, Hitzeindex, Windchill, 3-h-Drucktendenz und Regensummen über
+    1 h und 24 h (aus der Regenrate) für eine Reihe, mit NumPy ohne Schleife.
+
+    Die Regenrate gilt jeweils seit dem vorherigen Punkt; Lücken zählen höchstens
+    doppelt so lang wie der übliche Abstand."""
+    if np is not None:
+        return derived_numpy(timestamps, columns)
+    return derived_python(timestamps, columns)
+
+
+def derived_numpy(timestamps, columns):
+    if not len(timestamps):
+        return {key: [] for key in DERIVED_FIELDS}
+    ts = np.asarray(timestamps, dtype=np.int64)
+    t = np.asarray(columns["tempf"], dtype=np.float64)
+    rh = np.asarray(columns["humidity"], dtype=np.float64)
+    v = np.asarray(columns["windspeedmph"], dtype=np.float64)
+    p = np.asarray(columns["baromrelin"], dtype=np.float64)
+    rate = np.asarray(columns["rainratein"], dtype=np.float64)
+    result = {
+        "dewpoint": dew_point(t, np.clip(rh, 1, 100), np.log),
+        "heatindex": np.where(t >= 26.7, heat_index(t, rh), t),
+        "windchill": np.where((t <= 10) & (v > 4.8), wind_chill(t, v), t),
+    }
+    past = np.searchsorted(ts, ts - PRESSURE_TENDENCY_SPAN, side="right") - 1
+    tendency = (p - p[np.maximum(past, 0)]).astype(object)
+    tendency[past < 0] = None
+    result["pressure_tendency"] = tendency
+
+    steps = np.diff(ts)
+    typical = float(np.median(steps)) if len(steps) else 0.0
+    dt = np.minimum(np.r_[typical, steps], 2 * typical)
+    total = np.r_[0.0, np.cumsum(rate * dt / 3600)]
+    for key, window in (("rain_1h", 3600), ("rain_24h", 24 * 3600)):
+        lo = np.searchsorted(ts, ts - window, side="right")
+        result[key] = total[1:] - total[lo]
+    return {key: values.tolist() for key, values in result.items()}
+
+
+def derived_python(timestamps, columns):
+    result = {key: [] for key in DERIVED_FIELDS}
+    steps = sorted(b - a for a, b in zip(timestamps, timestamps[1:]))
+    typical = steps[len(steps) // 2] if steps else 0
+    total, totals = 0.0, [0.0]
+    for i, ts in enumerate(timestamps):
+        t = columns["tempf"][i]
+        rh = columns["humidity"][i]
+        v = columns["windspeedmph"][i]
+        result["dewpoint"].append(dew_point(t, min(max(rh, 1), 100)))
+        result["heatindex"].append(heat_index(t, rh) if t >= 26.7 else t)
+        result["windchill"].append(wind_chill(t, v) if t <= 10 and v > 4.8 else t)
+        past = bisect_right(timestamps, ts - PRESSURE_TENDENCY_SPAN) - 1
+        result["pressure_tendency"].append(
+            columns["baromrelin"][i] - columns["baromrelin"][past]
+            if past >= 0
+            else None
+        )
+        dt = min(ts - timestamps[i - 1], 2 * typical) if i else typical
+        total += columns["rainratein"][i] * dt / 3600
+        totals.append(total)
+        for key, window in (("rain_1h", 3600), ("rain_24h", 24 * 3600)):
+            lo = bisect_right(timestamps, ts - window)
+            result[key].append(total - totals[lo])
+    return result
+
+
+def add_derived(result, start):
+    # Abgeleitete Felder ergänzen und danach den Vorlauf vor `start` abschneiden
+    result.update(derived_series(result["timestamps"], result))
+    lo = bisect_left(result["timestamps"], start)
+    for target in (result, result.get("min", {}), result.get("max", {})):
+        for key, values in target.items():
+            if isinstance(values, list):
+                target[key] = values[lo:]
+    return result
+
 
-# Versuch, den Passkey aus externer Datei zu laden
-if os.path.exists(PASSKEY_FILE):
-    with open(PASSKEY_FILE) as f:
-        VALID_PASSKEY = f.read().strip()
-else:
-    VALID_PASSKEY = None
-    print("⚠️  WARNUNG: Datei 'passkey.txt' fehlt. POST-Zugriff wird verweigert.")
+def rollup_result(timestamps, rows, resolution):
+    # Buckets einer Stufe zu gröberen Buckets zusammenfassen, Ausgabe wie downsample()
+    merged_ts, merged = [], []
+    daily = resolution % (24 * 3600) == 0
+    for ts, row in zip(timestamps, rows):
+        offset = local_offset(ts) if daily else 0
+        bucket = ts - (ts + offset) % resolution
+        if merged_ts and merged_ts[-1] == bucket:
+            bucket_merge(merged[-1], row)
+        else:
+            merged_ts.append(bucket)
+            merged.append(list(row))
+
+    result = {"timestamps": merged_ts, "min": {}, "max": {}, "resolution": resolution}
+    i = 1
+    for key in SCALAR_FIELDS:
+        result[key] = [row[i] / row[0] for row in merged]
+        result["min"][key] = [row[i + 1] for row in merged]
+        result["max"][key] = [row[i + 2] for row in merged]
+        i += 3
+    result["winddir"] = [
+        round(math.degrees(math.atan2(row[i + 1], row[i])), 6) % 360 for row in merged
+    ]
+    return result
+
+
+def lttb_indices(timestamps, values, threshold):
+    # Largest-Triangle-Three-Buckets: wählt die Punkte, die die Kurvenform erhalten
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    indices = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Mittelwert des nächsten Buckets als dritter Dreieckspunkt
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_len = avg_end - avg_start
+        avg_x = sum(timestamps[avg_start:avg_end]) / avg_len
+        avg_y = sum(values[avg_start:avg_end]) / avg_len
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = timestamps[a], values[a]
+        best_area, best = -1.0, range_start
+        for j in range(range_start, range_end):
+            area = abs(
+                (ax - avg_x) * (values[j] - ay) - (ax - timestamps[j]) * (avg_y - ay)
+            )
+            if area > best_area:
+                best_area, best = area, j
+        indices.append(best)
+        a = best
+
+    indices.append(n - 1)
+    return indices
+
+
+@functools.lru_cache(maxsize=4096)
+def format_quarter(quarter):
+    # Zeitzonen weichen höchstens in Viertelstunden von UTC ab
+    return datetime.fromtimestamp(quarter * 900).strftime("%d.%m %H:%M")
+
+
+def format_timestamp(ts):
+    # strftime nur einmal pro Viertelstunde, die Minuten werden addiert
+    label = format_quarter(ts // 900)
+    return f"{label[:-2]}{int(label[-2:]) + ts % 900 // 60:02d}"
+
+
+def finish_result(result, cutoff):
+    # Epoch-Zeitstempel als Cursor für "since" behalten, Anzeigeformat ergänzen
+    result["epochs"] = result["timestamps"]
+    result["timestamps"] = [format_timestamp(ts) for ts in result["epochs"]]
+    result["cutoff"] = cutoff
+    return result
+
+
+def round_values(result):
+    for target in (result, result.get("min", {}), result.get("max", {})):
+        for key, digits in FIELD_DECIMALS.items():
+            if key in target:
+                target[key] = [
+                    v if v is None else round(v, digits or None) for v in target[key]
+                ]
+    return result
+
+
+def compact_result(result, cutoff):
+    # Statt Text-Zeitstempeln: Start plus festes Intervall, sonst Differenzen
+    epochs = result.pop("timestamps")
+    deltas = [b - a for a, b in zip(epochs, epochs[1:])]
+    result["format"] = "compact"
+    result["start"] = epochs[0] if epochs else None
+    if deltas and deltas.count(deltas[0]) == len(deltas):
+        result["interval"] = deltas[0]
+    else:
+        result["deltas"] = deltas
+    result["cutoff"] = cutoff
+    return result
+
+
+def data_response(result, cutoff):
+    if request.args.get("precision") != "full":
+        round_values(result)
+    if request.args.get("format") == "compact":
+        return compact_result(result, cutoff)
+    return finish_result(result, cutoff)
+
+
+class ResponseCache:
+    """LRU-Cache für fertig serialisierte und komprimierte Antworten.
+
+    Der Schlüssel enthält den Stand (seq) der Station, neue Messwerte machen
+    alte Einträge also wertlos; invalidate() räumt sie sofort weg. Gleichzeitige
+    Anfragen nach demselben Schlüssel warten auf eine einzige Berechnung.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], True
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()
+        try:
+            value = compute()
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+        return value, False
+
+    def invalidate(self, station_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == station_id]:
+                del self.entries[key]
+
+
+data_cache = ResponseCache()
+
+
+def latest_payload(ts, values, alerts=()):
+    # Letzter Messwert samt abgeleiteter Felder und aktiver Warnungen für
+    # /api/latest und /api/stream
+    if ts is None:
+        return {}
+    result = {"epoch": ts, "timestamp": format_timestamp(ts)}
+    result.update((key, values[key]) for key in FIELDS)
+    result["winddir_text"] = windrichtung_text(values["winddir"])
+    result["alerts"] = list(alerts)
+    return result
 
 
 def windrichtung_text(winddir):
@@ -32,58 +2691,160 @@ def windrichtung_text(winddir):
     return richtungen[idx]
 
 
+# Bereits auf der Konsole gemeldete unbekannte Passkeys
+unknown_passkeys = set()
+
+
+def convert_form(form):
+    # Ecowitt-Felder, wie sie das Gateway schickt, in die gespeicherten Einheiten
+    # Temperatur: wenn > 50, vermutlich Fahrenheit → umrechnen
+    tempf_raw = float(form.get("tempf", 0))
+    tempf = (tempf_raw - 32) * 5.0 / 9.0 if tempf_raw > 50 else tempf_raw
+
+    # Luftdruck: wenn < 35, vermutlich inHg → umrechnen
+    baromrelin_raw = float(form.get("baromrelin", 0))
+    baromrelin = baromrelin_raw * 33.8639 if baromrelin_raw < 35 else baromrelin_raw
+
+    return {
+        "tempf": tempf,
+        "humidity": float(form.get("humidity", 0)),
+        "baromrelin": baromrelin,
+        "windspeedmph": float(form.get("windspeedmph", 0)) * 1.60934,  # mph → km/h
+        "winddir": float(form.get("winddir", 0)),
+        "uv": float(form.get("uv", 0)),
+        "solarradiation": float(form.get("solarradiation", 0)),
+        "dailyrainin": float(form.get("dailyrainin", 0)) * 25.4,  # inch → mm
+        "hourlyrainin": float(form.get("hourlyrainin", 0)) * 25.4,
+        "rainratein": float(form.get("rainratein", 0)) * 25.4,
+    }
+
+
+def parse_import_time(value, utc=False):
+    # Zeit aus Ecowitt-Exporten (Ortszeit) bzw. dateutc aus Formulardaten (UTC)
+    value = value.strip()
+    if not utc and len(value) in (16, 19) and value[4] == "-" and value[13] == ":":
+        # Schnellweg wie bei parse_timestamp: Stundenanfang aus dem Cache
+        seconds = int(value[17:]) if len(value) == 19 else 0
+        return local_hour_start(value[:13]) + int(value[14:16]) * 60 + seconds
+    for fmt in IMPORT_TIME_FORMATS:
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return int((dt.replace(tzinfo=timezone.utc) if utc else dt).timestamp())
+    raise ValueError(value)
+
+
+def import_form(form):
+    # Ein Formular wie vom Gateway, mit dateutc oder Epoch unter "timestamp"
+    if "dateutc" in form:
+        ts = parse_import_time(form["dateutc"], utc=True)
+    else:
+        ts = int(form["timestamp"])
+    return ts, convert_form(form)
+
+
+def import_csv(f):
+    reader = csv.reader(f)
+    header = [title.lstrip("\ufeff").strip() for title in next(reader, [])]
+    if header[:1] == ["timestamp"]:
+        # Eigenes Format (wetterdaten.csv, /api/export): schon umgerechnet
+        columns = [(key, header.index(key)) for key in FIELDS if key in header]
+        for row in reader:
+            try:
+                values = dict.fromkeys(FIELDS, 0.0)
+                values.update((key, float(row[i])) for key, i in columns)
+                yield parse_timestamp(row[0]), values
+            except (IndexError, ValueError):
+                yield None
+        return
+
+    # Ecowitt-Export: Einheit steht in Klammern hinter dem Spaltennamen
+    names = [title.partition("(")[0].strip().lower() for title in header]
+    if "time" not in names:
+        raise ValueError("Keine Spalte 'Time' gefunden")
+    time_col = names.index("time")
+    columns = []
+    for key, pattern in ECOWITT_COLUMNS:
+        i = next((i for i, name in enumerate(names) if re.search(pattern, name)), None)
+        if i is not None:
+            unit = header[i].partition("(")[2].rstrip(") ").strip().lower()
+            columns.append((key, i, ECOWITT_UNITS.get(unit, 1.0)))
+    for row in reader:
+        try:
+            form = {key: float(row[i]) * factor for key, i, factor in columns}
+        except (IndexError, ValueError):
+            # "--" für fehlende Sensoren: wie ein fehlendes Formularfeld
+            form = {}
+            for key, i, factor in columns:
+                try:
+                    form[key] = float(row[i]) * factor
+                except (IndexError, ValueError):
+                    pass
+        try:
+            yield parse_import_time(row[time_col]), convert_form(form)
+        except (IndexError, ValueError):
+            yield None
+
+
+def read_import(f, fmt):
+    """(ts, Werte) aus einer Import-Datei im Textmodus; None für unlesbare Zeilen."""
+    if fmt == "csv":
+        yield from import_csv(f)
+        return
+    forms = json.load(f) if fmt == "json" else (json.loads(l) for l in f if l.strip())
+    for form in forms:
+        try:
+            yield import_form(form)
+        except (KeyError, TypeError, ValueError):
+            yield None
+
+
 @app.route("/", methods=["GET", "POST"])
 def receive_data():
     if request.method == "POST":
-        if VALID_PASSKEY is None:
-            return "Serverfehler: Kein gültiger PASSKEY definiert.", 500
-
         passkey = request.form.get("PASSKEY")
-        if passkey != VALID_PASSKEY:
+        if passkey not in PASSKEYS:
+            # Zum Einrichten: unbekannte Passkeys einmalig auf der Konsole zeigen,
+            # ins Log-File gelangen sie nicht
+            if (
+                passkey
+                and len(unknown_passkeys) < 32
+                and passkey not in unknown_passkeys
+            ):
+                unknown_passkeys.add(passkey)
+                print(f"Unbekannter PASSKEY empfangen: {passkey}")
+            if not PASSKEYS:
+                return "Serverfehler: Kein gültiger PASSKEY definiert.", 500
             abort(403)
+        station = stations[PASSKEYS[passkey]]
+        ingest = station.ingest
 
-        # Logge rohe POST-Daten zur Fehleranalyse
-        with open(LOG_FILE, "a") as log:
-            log.write(f"{datetime.now().isoformat()} {request.form}\n")
+        # Stichprobe der rohen POST-Daten zur Fehleranalyse (geschrieben wird im
+        # Hintergrund, der Passkey wird geschwärzt)
+        if debug_log.sampled():
+            ingest.log(debug_log.record("info", "post", station.id, request.form))
 
         try:
-            # Temperatur: wenn > 50, vermutlich Fahrenheit → umrechnen
-            tempf_raw = float(request.form.get("tempf", 0))
-            tempf = (tempf_raw - 32) * 5.0 / 9.0 if tempf_raw > 50 else tempf_raw
-
-            # Luftdruck: wenn < 35, vermutlich inHg → umrechnen
-            baromrelin_raw = float(request.form.get("baromrelin", 0))
-            baromrelin = (
-                baromrelin_raw * 33.8639 if baromrelin_raw < 35 else baromrelin_raw
-            )
-
-            data = {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "tempf": tempf,
-                "humidity": float(request.form.get("humidity", 0)),
-                "baromrelin": baromrelin,
-                "windspeedmph": float(request.form.get("windspeedmph", 0))
-                * 1.60934,  # mph → km/h
-                "winddir": float(request.form.get("winddir", 0)),
-                "uv": float(request.form.get("uv", 0)),
-                "solarradiation": float(request.form.get("solarradiation", 0)),
-                "dailyrainin": float(request.form.get("dailyrainin", 0))
-                * 25.4,  # inch → mm
-                "hourlyrainin": float(request.form.get("hourlyrainin", 0)) * 25.4,
-                "rainratein": float(request.form.get("rainratein", 0)) * 25.4,
-            }
-
-            file_exists = os.path.isfile(DATA_FILE)
-            with open(DATA_FILE, "a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(data)
+            ts = int(datetime.now().timestamp())
+            data = convert_form(request.form)
         except Exception as e:
-            with open(LOG_FILE, "a") as log:
-                log.write(f"Fehler beim Schreiben: {e}\n")
+            for key in FIELDS:
+                try:
+                    float(request.form.get(key, 0))
+                except (TypeError, ValueError):
+                    PARSE_ERRORS.inc(field=key)
+            ingest.log(
+                debug_log.record(
+                    "error", "parse_error", station.id, request.form, error=str(e)
+                )
+            )
             abort(500)
 
+        # Geschrieben wird gebündelt im Hintergrund
+        if not ingest.submit(ts, data):
+            SAMPLES_REJECTED.inc(station=station.id)
+            return "Serverfehler: Warteschlange voll.", 503
         return "OK"
     else:
         # automatische Weiterleitung je nach Gerät
@@ -94,7 +2855,188 @@ def receive_data():
             return redirect("/desktop")
 
 
+# Dateien unter /static mit ?v=<Hash> dürfen ein Jahr lang gecacht werden
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+@functools.lru_cache(maxsize=None)
+def static_version(filename):
+    with open(os.path.join(app.static_folder, filename), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def versioned_static(html):
+    # Hängt an jeden /static-Pfad den Inhalts-Hash, damit neue Logos sofort ankommen
+    return re.sub(
+        r'"/static/([^"?]+)"',
+        lambda m: f'"/static/{m[1]}?v={static_version(m[1])}"',
+        html,
+    )
+
+
+def negotiate_encoding(available):
+    return next(
+        (
+            enc
+            for enc in ("br", "gzip")
+            if enc in available and request.accept_encodings[enc]
+        ),
+        "identity",
+    )
+
+
+def compress(body, encoding, best=False):
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else 5)
+    return gzip.compress(body, 9 if best else 6, mtime=0)
+
+
+def encode_variants(body, best=False):
+    # Unkomprimiert plus alle unterstützten Kodierungen, einmal pro Inhalt
+    variants = {"identity": body}
+    if len(body) >= COMPRESS_MIN_SIZE or best:
+        variants["gzip"] = compress(body, "gzip", best)
+        if brotli is not None:
+            variants["br"] = compress(body, "br", best)
+    return variants
+
+
+def precompiled(view=None, *, mimetype="text/html"):
+    """Seiten ohne dynamische Inhalte nur einmal rendern und danach mit ETag
+    und vorkomprimiert (gzip, Brotli falls installiert) ausliefern."""
+    if view is None:
+        return functools.partial(precompiled, mimetype=mimetype)
+    page = None
+
+    @functools.wraps(view)
+    def wrapper():
+        nonlocal page
+        if page is None:
+            body = versioned_static(view()).encode("utf-8")
+            variants = encode_variants(body, best=True)
+            page = (hashlib.sha256(body).hexdigest()[:16], variants)
+        digest, variants = page
+        encoding = negotiate_encoding(variants)
+        # Starkes ETag pro Kodierung, da sich die Bytes unterscheiden
+        etag = f"{digest}-{encoding}"
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(variants[encoding])
+            response.mimetype = mimetype
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        # Nach einem Update soll die neue Seite sofort kommen, sonst reicht ein 304
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    return wrapper
+
+
+@app.after_request
+def compress_json(response):
+    # API-Antworten (nicht den SSE-Stream) je nach Accept-Encoding komprimieren
+    if (
+        response.mimetype != "application/json"
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding(("gzip", "br") if brotli is not None else ("gzip",))
+    response.vary.add("Accept-Encoding")
+    if encoding != "identity":
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.after_request
+def cache_static(response):
+    if request.endpoint == "static" and "v" in request.args:
+        response.headers["Cache-Control"] = (
+            f"public, max-age={STATIC_MAX_AGE}, immutable"
+        )
+    return response
+
+
+# Gemeinsamer Teil aller Seiten: Service Worker anmelden und ein kleiner
+# Schlüssel-Wert-Speicher in IndexedDB für bereits geladene Messwerte
+OFFLINE_JS = """
+        if ("serviceWorker" in navigator) navigator.serviceWorker.register("/sw.js");
+
+        const offlineDb = new Promise(resolve => {
+          if (!window.indexedDB) return resolve(null);
+          const req = indexedDB.open("wetter", 1);
+          req.onupgradeneeded = () => req.result.createObjectStore("cache");
+          req.onsuccess = () => resolve(req.result);
+          req.onerror = () => resolve(null);
+        });
+
+        async function cacheGet(key) {
+          const db = await offlineDb;
+          if (!db) return null;
+          return new Promise(resolve => {
+            const req = db.transaction("cache").objectStore("cache").get(key);
+            req.onsuccess = () => resolve(req.result ?? null);
+            req.onerror = () => resolve(null);
+          });
+        }
+
+        async function cachePut(key, value) {
+          const db = await offlineDb;
+          if (db) db.transaction("cache", "readwrite").objectStore("cache").put(value, key);
+        }
+"""
+
+
+@app.route("/sw.js")
+@precompiled(mimetype="application/javascript")
+def service_worker():
+    # Seiten, Logos und Chart.js für den Offline-Betrieb; Messwerte liegen in IndexedDB
+    return """
+const CACHE = "wetter-v1";
+const PAGES = ["/mobile", "/desktop", "/charts"];
+
+self.addEventListener("install", () => self.skipWaiting());
+self.addEventListener("activate", event => event.waitUntil(
+  caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+    .then(() => self.clients.claim())
+));
+
+self.addEventListener("fetch", event => {
+  const url = new URL(event.request.url);
+  if (event.request.method !== "GET") return;
+  // Seiten unabhängig von ?station=, sie sind für alle Stationen gleich
+  const page = url.origin === location.origin && PAGES.includes(url.pathname);
+  const asset = url.origin === location.origin
+    ? url.pathname.startsWith("/static/")
+    : url.hostname === "cdn.jsdelivr.net";
+  if (!page && !asset) return;
+  const key = page ? url.pathname : event.request;
+
+  // Sofort aus dem Cache, im Hintergrund nachfragen (meist nur ein 304)
+  event.respondWith(caches.open(CACHE).then(async cache => {
+    const cached = await cache.match(key);
+    const fresh = fetch(event.request).then(res => {
+      if (res.ok || res.type === "opaque") cache.put(key, res.clone());
+      return res;
+    });
+    if (!cached) return fresh;
+    event.waitUntil(fresh.catch(() => {}));
+    return cached;
+  }));
+});
+"""
+
+
 @app.route("/mobile")
+@precompiled
 def dashboard():
     return render_template_string(
         """
@@ -179,6 +3121,17 @@ def dashboard():
           font-weight: bold;
         }
 
+        .alerts {
+          max-width: 900px;
+          margin: 0 auto 1.5rem auto;
+          padding: 0.8rem 1rem;
+          border-radius: 1rem;
+          background: #b71c1c;
+          color: #ffffff;
+          font-weight: bold;
+          text-align: center;
+        }
+
         .footer {
           text-align: center;
           margin-top: 2rem;
@@ -231,6 +3184,8 @@ def dashboard():
         <h1>🌤️ FediCamp-Wetter</h1>
       </div>
 
+      <div class="alerts" id="alerts" hidden></div>
+
       <div class="grid">
         <div class="card"><div class="label">🌡️ Temperatur</div><div class="value" id="temp">--</div></div>
         <div class="card"><div class="label">💧 Luftfeuchtigkeit</div><div class="value" id="hum">--</div></div>
@@ -258,15 +3213,20 @@ def dashboard():
         </div>
       </div>
 
+      <div class="footer"><span id="last">Letzte Aktualisierung: --</span><span id="offline" hidden> (offline)</span></div>
+
 <div class="toggle-wrapper">
   <button class="toggle" onclick="toggleTheme()">🌓 Modus wechseln</button>
-  <a href="/charts" class="toggle" style="margin-left: 1rem; text-decoration: none;">📊 Diagramme</a>
+  <a href="/charts" id="charts-link" class="toggle" style="margin-left: 1rem; text-decoration: none;">📊 Diagramme</a>
 </div>
 
 
 
 
       <script>
+        // Stations-ID aus der Adresse, z. B. /mobile?station=garten
+        const station = encodeURIComponent(new URLSearchParams(location.search).get("station") || "default");
+        document.getElementById("charts-link").search = location.search;
         function toggleTheme() {
           const html = document.documentElement;
           const current = html.getAttribute("data-theme") || "dark";
@@ -302,47 +3262,74 @@ def dashboard():
               : "/static/nerdzoommedialight.png";
           }
         }
-function getWindDirectionLabel(degree) {
-  const directions = [
-    "Nord", "Nord-Ost", "Osten", "Süd-Ost",
-    "Süd", "Süd-West", "West", "Nord-West"
-  ];
-  const index = Math.round(degree / 45) % 8;
-  return directions[index];
-}
 
+{{ offline_js|safe }}
         async function updateData() {
-          const res = await fetch("/api/data?range=1h");
-          const data = await res.json();
-          const last = data.timestamps.at(-1) || "--";
-
-          document.getElementById("temp").textContent = data.tempf.at(-1)?.toFixed(1) + " °C" || "--";
-          document.getElementById("hum").textContent = data.humidity.at(-1)?.toFixed(0) + " %" || "--";
-          document.getElementById("press").textContent = data.baromrelin.at(-1)?.toFixed(2) + " hPa" || "--";
-          document.getElementById("wind").textContent = data.windspeedmph.at(-1)?.toFixed(2) + " km/h" || "--";
-          const winddirVal = data.winddir.at(-1);
+          try {
+            const res = await fetch(`/api/latest?station=${station}`);
+            if (!res.ok) throw new Error("HTTP " + res.status);
+            show(await res.json());
+          } catch (err) {
+            // Offline: die gespeicherten Werte bleiben stehen
+            document.getElementById("offline").hidden = false;
+          }
+        }
+
+        function show(data) {
+          document.getElementById("offline").hidden = true;
+          render(data);
+          cachePut(`latest:${station}`, data);
+        }
+
+        function render(data) {
+          // Aktive Warnungen aus den Regeln in alerts.txt, vor allem anderen
+          const alerts = data.alerts || [];
+          const banner = document.getElementById("alerts");
+          banner.textContent = alerts.map(a => `⚠️ ${a.name} (${a.value?.toFixed(1)})`).join("  ");
+          banner.hidden = alerts.length === 0;
+
+          const last = data.timestamp || "--";
+
+          document.getElementById("temp").textContent = data.tempf?.toFixed(1) + " °C" || "--";
+          document.getElementById("hum").textContent = data.humidity?.toFixed(0) + " %" || "--";
+          document.getElementById("press").textContent = data.baromrelin?.toFixed(2) + " hPa" || "--";
+          document.getElementById("wind").textContent = data.windspeedmph?.toFixed(2) + " km/h" || "--";
+          const winddirVal = data.winddir;
           const winddirText = winddirVal != null
-            ? Math.round(winddirVal) + "° " + getWindDirectionLabel(winddirVal)
+            ? Math.round(winddirVal) + "° " + data.winddir_text
             : "--";
           document.getElementById("winddir").textContent = winddirText;
-          document.getElementById("solar").textContent = data.solarradiation.at(-1)?.toFixed(1) + " W/m²" || "--";
-          document.getElementById("uv").textContent = data.uv.at(-1) || "--";
-          document.getElementById("rainrate").textContent = data.rainratein.at(-1)?.toFixed(2) + " mm/h" || "--";
-          document.getElementById("rainhour").textContent = data.hourlyrainin.at(-1)?.toFixed(2) + " mm" || "--";
-          document.getElementById("rainday").textContent = data.dailyrainin.at(-1)?.toFixed(2) + " mm" || "--";
+          document.getElementById("solar").textContent = data.solarradiation?.toFixed(1) + " W/m²" || "--";
+          document.getElementById("uv").textContent = data.uv || "--";
+          document.getElementById("rainrate").textContent = data.rainratein?.toFixed(2) + " mm/h" || "--";
+          document.getElementById("rainhour").textContent = data.hourlyrainin?.toFixed(2) + " mm" || "--";
+          document.getElementById("rainday").textContent = data.dailyrainin?.toFixed(2) + " mm" || "--";
           document.getElementById("last").textContent = "Letzte Aktualisierung: " + last;
         }
 
-        updateData();
-        setInterval(updateData, 30000);
+        // Live-Updates per Server-Sent Events, Polling nur solange der Stream nicht steht
+        let source = null;
+        if (window.EventSource) {
+          source = new EventSource(`/api/stream?station=${station}`);
+          source.onmessage = (event) => show(JSON.parse(event.data));
+        }
+
+        // Erst sofort die zuletzt gesehenen Werte, dann frische vom Server
+        cacheGet(`latest:${station}`).then(data => data && render(data)).then(updateData);
+        window.addEventListener("online", updateData);
+        setInterval(() => {
+          if (!source || source.readyState !== EventSource.OPEN) updateData();
+        }, 30000);
       </script>
     </body>
     </html>
-    """
+    """,
+        offline_js=OFFLINE_JS,
     )
 
 
 @app.route("/desktop")
+@precompiled
 def desktop():
     return render_template_string(
         """
@@ -427,6 +3414,17 @@ def desktop():
           font-weight: bold;
         }
 
+        .alerts {
+          max-width: 900px;
+          margin: 0 auto 1.5rem auto;
+          padding: 0.8rem 1rem;
+          border-radius: 1rem;
+          background: #b71c1c;
+          color: #ffffff;
+          font-weight: bold;
+          text-align: center;
+        }
+
         .footer {
           text-align: center;
           margin-top: 3rem;
@@ -474,6 +3472,8 @@ def desktop():
         <h1>🌤️ FediCamp-Wetter</h1>
       </div>
 
+      <div class="alerts" id="alerts" hidden></div>
+
       <div class="grid">
         <div class="card"><div class="label">🌡️ Temperatur</div><div class="value" id="temp">--</div></div>
         <div class="card"><div class="label">💧 Luftfeuchtigkeit</div><div class="value" id="hum">--</div></div>
@@ -507,12 +3507,15 @@ def desktop():
 <div class="footer" id="error" style="color: red; display: none;"></div>
     <div class="toggle-wrapper">
   <button class="toggle" onclick="toggleTheme()">🌓 Modus wechseln</button>
-  <a href="/charts" class="toggle" style="margin-left: 1rem; text-decoration: none;">📊 Diagramme</a>
+  <a href="/charts" id="charts-link" class="toggle" style="margin-left: 1rem; text-decoration: none;">📊 Diagramme</a>
 </div>
 
 
 
       <script>
+        // Stations-ID aus der Adresse, z. B. /mobile?station=garten
+        const station = encodeURIComponent(new URLSearchParams(location.search).get("station") || "default");
+        document.getElementById("charts-link").search = location.search;
         function toggleTheme() {
           const html = document.documentElement;
           const current = html.getAttribute("data-theme") || "dark";
@@ -548,41 +3551,15 @@ def desktop():
               : "/static/nerdzoommedialight.png";
           }
         }
-function getWindDirectionLabel(degree) {
-  const directions = [
-    "Nord", "Nord-Ost", "Osten", "Süd-Ost",
-    "Süd", "Süd-West", "West", "Nord-West"
-  ];
-  const index = Math.round(degree / 45) % 8;
-  return directions[index];
-}
 
+{{ offline_js|safe }}
 async function updateData() {
   const errorElem = document.getElementById("error");
   try {
-    const res = await fetch("/api/data?range=1h");
+    const res = await fetch(`/api/latest?station=${station}`);
     if (!res.ok) throw new Error("HTTP " + res.status);
 
-    const data = await res.json();
-    const last = data.timestamps.at(-1) || "--";
-
-    document.getElementById("temp").textContent = data.tempf.at(-1)?.toFixed(1) + " °C" || "--";
-    document.getElementById("hum").textContent = data.humidity.at(-1)?.toFixed(0) + " %" || "--";
-    document.getElementById("press").textContent = data.baromrelin.at(-1)?.toFixed(2) + " hPa" || "--";
-    document.getElementById("wind").textContent = data.windspeedmph.at(-1)?.toFixed(2) + " km/h" || "--";
-
-    const winddirVal = data.winddir.at(-1);
-    const winddirText = winddirVal != null
-      ? Math.round(winddirVal) + "° " + getWindDirectionLabel(winddirVal)
-      : "--";
-    document.getElementById("winddir").textContent = winddirText;
-
-    document.getElementById("solar").textContent = data.solarradiation.at(-1)?.toFixed(1) + " W/m²" || "--";
-    document.getElementById("uv").textContent = data.uv.at(-1) || "--";
-    document.getElementById("rainrate").textContent = data.rainratein.at(-1)?.toFixed(2) + " mm/h" || "--";
-    document.getElementById("rainhour").textContent = data.hourlyrainin.at(-1)?.toFixed(2) + " mm" || "--";
-    document.getElementById("rainday").textContent = data.dailyrainin.at(-1)?.toFixed(2) + " mm" || "--";
-    document.getElementById("last").textContent = "Letzte Aktualisierung: " + last;
+    show(await res.json());
 
     // Fehleranzeige ausblenden
     if (errorElem) errorElem.style.display = "none";
@@ -590,22 +3567,71 @@ async function updateData() {
   } catch (err) {
     console.error("Fehler beim Laden der Daten:", err);
     if (errorElem) {
-      errorElem.textContent = "⚠️ Fehler beim Abrufen der Daten. Neuer Versuch in 30 Sekunden …";
+      errorElem.textContent = "⚠️ Offline – angezeigt werden die zuletzt gespeicherten Werte.";
       errorElem.style.display = "block";
     }
   }
 }
 
-        updateData();
-        setInterval(updateData, 30000);
+function show(data) {
+    render(data);
+    cachePut(`latest:${station}`, data);
+}
+
+function render(data) {
+    // Aktive Warnungen aus den Regeln in alerts.txt, vor allem anderen
+    const alerts = data.alerts || [];
+    const banner = document.getElementById("alerts");
+    banner.textContent = alerts.map(a => `⚠️ ${a.name} (${a.value?.toFixed(1)})`).join("  ");
+    banner.hidden = alerts.length === 0;
+
+    const last = data.timestamp || "--";
+
+    document.getElementById("temp").textContent = data.tempf?.toFixed(1) + " °C" || "--";
+    document.getElementById("hum").textContent = data.humidity?.toFixed(0) + " %" || "--";
+    document.getElementById("press").textContent = data.baromrelin?.toFixed(2) + " hPa" || "--";
+    document.getElementById("wind").textContent = data.windspeedmph?.toFixed(2) + " km/h" || "--";
+
+    const winddirVal = data.winddir;
+    const winddirText = winddirVal != null
+      ? Math.round(winddirVal) + "° " + data.winddir_text
+      : "--";
+    document.getElementById("winddir").textContent = winddirText;
+
+    document.getElementById("solar").textContent = data.solarradiation?.toFixed(1) + " W/m²" || "--";
+    document.getElementById("uv").textContent = data.uv || "--";
+    document.getElementById("rainrate").textContent = data.rainratein?.toFixed(2) + " mm/h" || "--";
+    document.getElementById("rainhour").textContent = data.hourlyrainin?.toFixed(2) + " mm" || "--";
+    document.getElementById("rainday").textContent = data.dailyrainin?.toFixed(2) + " mm" || "--";
+    document.getElementById("last").textContent = "Letzte Aktualisierung: " + last;
+}
+
+        // Live-Updates per Server-Sent Events, Polling nur solange der Stream nicht steht
+        let source = null;
+        if (window.EventSource) {
+          source = new EventSource(`/api/stream?station=${station}`);
+          source.onmessage = (event) => {
+            show(JSON.parse(event.data));
+            document.getElementById("error").style.display = "none";
+          };
+        }
+
+        // Erst sofort die zuletzt gesehenen Werte, dann frische vom Server
+        cacheGet(`latest:${station}`).then(data => data && render(data)).then(updateData);
+        window.addEventListener("online", updateData);
+        setInterval(() => {
+          if (!source || source.readyState !== EventSource.OPEN) updateData();
+        }, 30000);
       </script>
     </body>
     </html>
-    """
+    """,
+        offline_js=OFFLINE_JS,
     )
 
 
 @app.route("/charts")
+@precompiled
 def charts():
     return render_template_string(
         """
@@ -688,41 +3714,67 @@ def charts():
         <option value="1h">Letzte Stunde</option>
         <option value="24h" selected>Letzter Tag</option>
         <option value="7d">Letzte Woche</option>
+        <option value="30d">Letzte 30 Tage</option>
+        <option value="1y">Letztes Jahr</option>
       </select>
 
       <button class="toggle" onclick="toggleTheme()">🌓 Modus wechseln</button>
     </div>
 
-    <p style="text-align:center"><b>Aktualisiert:</b> <span id="lastUpdate">–</span></p>
+    <p style="text-align:center"><b>Aktualisiert:</b> <span id="lastUpdate">–</span><span id="offline" hidden> (offline)</span></p>
 
     <canvas id="tempf"></canvas>
+    <canvas id="dewpoint"></canvas>
+    <canvas id="heatindex"></canvas>
+    <canvas id="windchill"></canvas>
     <canvas id="humidity"></canvas>
     <canvas id="baromrelin"></canvas>
+    <canvas id="pressure_tendency"></canvas>
     <canvas id="windspeedmph"></canvas>
     <canvas id="uv"></canvas>
     <canvas id="solarradiation"></canvas>
     <canvas id="rainratein"></canvas>
+    <canvas id="rain_1h"></canvas>
+    <canvas id="rain_24h"></canvas>
   </div>
 
   <script>
-    const chartTypes = ["tempf", "humidity", "baromrelin", "windspeedmph", "uv", "solarradiation", "rainratein"];
+    // Stations-ID aus der Adresse, z. B. /mobile?station=garten
+    const station = encodeURIComponent(new URLSearchParams(location.search).get("station") || "default");
+{{ offline_js|safe }}
+    const chartTypes = [
+      "tempf", "dewpoint", "heatindex", "windchill", "humidity", "baromrelin", "pressure_tendency",
+      "windspeedmph", "uv", "solarradiation", "rainratein", "rain_1h", "rain_24h"
+    ];
     const chartLabels = {
       tempf: "Temperatur (°C)",
+      dewpoint: "Taupunkt (°C)",
+      heatindex: "Hitzeindex (°C)",
+      windchill: "Windchill (°C)",
       humidity: "Luftfeuchtigkeit (%)",
       baromrelin: "Luftdruck (hPa)",
+      pressure_tendency: "Drucktendenz 3 h (hPa)",
       windspeedmph: "Windgeschwindigkeit (km/h)",
       uv: "UV-Index",
       solarradiation: "Sonneneinstrahlung (W/m²)",
-      rainratein: "Regenrate (mm/h)"
+      rainratein: "Regenrate (mm/h)",
+      rain_1h: "Regen letzte Stunde (mm)",
+      rain_24h: "Regen letzte 24 h (mm)"
     };
     const chartColors = {
       tempf: "red",
+      dewpoint: "teal",
+      heatindex: "crimson",
+      windchill: "steelblue",
       humidity: "blue",
       baromrelin: "orange",
+      pressure_tendency: "darkorange",
       windspeedmph: "green",
       uv: "purple",
       solarradiation: "gold",
-      rainratein: "gray"
+      rainratein: "gray",
+      rain_1h: "slategray",
+      rain_24h: "dimgray"
     };
 
     let charts = {};
@@ -738,14 +3790,17 @@ def charts():
       };
     }
 
-    async function draw(id, label, color) {
-      const range = document.getElementById("range").value;
-      const res = await fetch(`/api/data?range=${range}`);
-      const data = await res.json();
-      const themeColors = getThemeColors();
+    function draw(id, label, color, data) {
+      // Vorhandene Diagramme nur mit neuen Daten füttern statt neu aufzubauen
+      if (charts[id]) {
+        charts[id].data.labels = data.timestamps;
+        charts[id].data.datasets[0].data = data[id];
+        charts[id].update("none");
+        return;
+      }
 
+      const themeColors = getThemeColors();
       const ctx = document.getElementById(id).getContext("2d");
-      if (charts[id]) charts[id].destroy();
 
       charts[id] = new Chart(ctx, {
         type: "line",
@@ -787,9 +3842,130 @@ def charts():
       });
     }
 
-    function loadAllCharts() {
-      chartTypes.forEach(id => draw(id, chartLabels[id], chartColors[id]));
-      document.getElementById("lastUpdate").textContent = new Date().toLocaleString("de-DE");
+    // Aktuell angezeigte Reihe samt Abfrageparametern, Basis für inkrementelle Updates
+    let series = null;
+
+    async function fetchData(params) {
+      try {
+        const res = await fetch(`/api/data?station=${station}&${params}&format=compact&derived=1`);
+        if (!res.ok) throw new Error("HTTP " + res.status);
+        document.getElementById("offline").hidden = true;
+        return expand(await res.json());
+      } catch (err) {
+        // Offline: weiter mit dem, was schon da ist
+        document.getElementById("offline").hidden = false;
+        return null;
+      }
+    }
+
+    const seriesKey = (range, maxPoints) => `data:${station}:${range}:${maxPoints}`;
+
+    async function loadAllCharts(useCache = true) {
+      // Ein Abruf für alle Diagramme
+      const range = document.getElementById("range").value;
+      // Nicht mehr Punkte holen, als ein Diagramm Pixel breit ist
+      const width = document.getElementById(chartTypes[0]).clientWidth || 600;
+      const maxPoints = Math.max(100, Math.min(1000, width));
+
+      // Schon einmal geladen: sofort zeichnen und nur die Lücke bis jetzt holen
+      const cached = useCache && await cacheGet(seriesKey(range, maxPoints));
+      if (cached) {
+        series = { range, maxPoints, data: cached };
+        drawAll();
+        return updateCharts();
+      }
+
+      const data = await fetchData(`range=${range}&max_points=${maxPoints}`);
+      if (!data) return;
+      series = { range, maxPoints, data };
+      drawAll();
+      cachePut(seriesKey(range, maxPoints), data);
+    }
+
+    async function updateCharts() {
+      // Nur die Punkte ab dem letzten bekannten Zeitpunkt nachladen
+      const range = document.getElementById("range").value;
+      const since = series?.data.epochs.at(-1);
+      if (!series || series.range !== range || since == null) return loadAllCharts(false);
+
+      const update = await fetchData(`range=${range}&max_points=${series.maxPoints}&since=${since}`);
+      if (!update) return;
+      if (update.resolution !== series.data.resolution) return loadAllCharts(false);
+
+      mergeSeries(series.data, update);
+      drawAll();
+      cachePut(seriesKey(series.range, series.maxPoints), series.data);
+    }
+
+    const pad = n => String(n).padStart(2, "0");
+
+    function formatEpoch(epoch) {
+      // Wie früher serverseitig: "TT.MM HH:MM" in Ortszeit
+      const d = new Date(epoch * 1000);
+      return `${pad(d.getDate())}.${pad(d.getMonth() + 1)} ${pad(d.getHours())}:${pad(d.getMinutes())}`;
+    }
+
+    function expand(data) {
+      // Kompaktformat: Zeitstempel aus Start plus Intervall bzw. Differenzen
+      const epochs = [];
+      if (data.start != null) {
+        epochs.push(data.start);
+        for (let i = 1; i < data.tempf.length; i++) {
+          epochs.push(epochs[i - 1] + (data.interval ?? data.deltas[i - 1]));
+        }
+      }
+      for (const key of ["format", "start", "interval", "deltas"]) delete data[key];
+      data.epochs = epochs;
+      data.timestamps = epochs.map(formatEpoch);
+      return data;
+    }
+
+    function mergeSeries(data, update) {
+      // Ab dem ersten neuen Punkt ersetzen (der letzte Bucket kann sich geändert haben) ...
+      const first = update.epochs[0];
+      let keep = first == null ? -1 : data.epochs.findIndex(e => e >= first);
+      if (keep < 0) keep = data.epochs.length;
+      // ... und vorne abschneiden, was aus dem Zeitfenster gefallen ist
+      let drop = data.epochs.findIndex(e => e >= update.cutoff);
+      if (drop < 0) drop = keep;
+      spliceArrays(data, update, keep, drop);
+      data.cutoff = update.cutoff;
+    }
+
+    function spliceArrays(target, update, keep, drop) {
+      for (const key of Object.keys(target)) {
+        if (Array.isArray(target[key])) {
+          target[key].splice(keep);
+          target[key].push(...(update[key] || []));
+          target[key].splice(0, drop);
+        } else if (target[key] && typeof target[key] === "object") {
+          spliceArrays(target[key], update[key] || {}, keep, drop);
+        }
+      }
+    }
+
+    function drawAll() {
+      chartTypes.forEach(id => draw(id, chartLabels[id], chartColors[id], series.data));
+      // Zeitpunkt des letzten Messwerts, auch wenn er aus dem Offline-Cache stammt
+      const last = series.data.epochs.at(-1);
+      document.getElementById("lastUpdate").textContent =
+        last == null ? "–" : new Date(last * 1000).toLocaleString("de-DE");
+    }
+
+    function applyTheme() {
+      // Nur die Farben der bestehenden Diagramme umstellen, ohne neu zu laden
+      const themeColors = getThemeColors();
+      Object.values(charts).forEach(chart => {
+        const { plugins, scales } = chart.options;
+        plugins.legend.labels.color = themeColors.text;
+        chart.data.datasets[0].backgroundColor = themeColors.text + "33";
+        ["x", "y"].forEach(axis => {
+          scales[axis].ticks.color = themeColors.text;
+          scales[axis].grid.color = themeColors.grid;
+          scales[axis].title.color = themeColors.text;
+        });
+        chart.update("none");
+      });
     }
 
     function toggleTheme() {
@@ -800,7 +3976,7 @@ def charts():
       html.classList.remove(current);
       html.classList.add(newTheme);
       localStorage.setItem("theme", newTheme);
-      loadAllCharts(); // neu rendern!
+      applyTheme();
     }
 
     (function initTheme() {
@@ -810,57 +3986,486 @@ def charts():
       document.documentElement.classList.add(defaultTheme);
     })();
 
-    setInterval(loadAllCharts, 60000);
-    window.onload = loadAllCharts;
+    // Neue Messwerte werden per Server-Sent Events gemeldet und dann inkrementell geholt
+    let source = null;
+    if (window.EventSource) {
+      source = new EventSource(`/api/stream?station=${station}`);
+      source.onmessage = () => updateCharts();
+    }
+
+    // Polling nur als Rückfallebene, solange der Stream nicht verbunden ist
+    setInterval(() => {
+      if (!source || source.readyState !== EventSource.OPEN) updateCharts();
+    }, 60000);
+    window.addEventListener("online", () => updateCharts());
+    window.onload = () => loadAllCharts();
   </script>
 </body>
 </html>
 
-    """
+    """,
+        offline_js=OFFLINE_JS,
     )
 
 
 @app.route("/api/data")
 def api_data():
+    station = get_station()
+    key = (
+        station.id,
+        station.store.seq,
+        tuple(request.args.get(name) for name in DATA_PARAMS),
+    )
+    variants, hit = data_cache.get(
+        key,
+        lambda: encode_variants(
+            app.json.dumps(query_data(station), separators=(",", ":")).encode()
+        ),
+    )
+    encoding = negotiate_encoding(variants)
+    response = make_response(variants[encoding])
+    response.mimetype = "application/json"
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return response
+
+
+def query_data(station):
+    store, rollups = station.store, station.rollups
     range = request.args.get("range", "24h")
-    cutoff = datetime.now()
-    if range == "1h":
-        cutoff -= timedelta(hours=1)
-    elif range == "24h":
-        cutoff -= timedelta(days=1)
-    elif range == "7d":
-        cutoff -= timedelta(days=7)
+    # Optional: serverseitig verdichten (max_points oder resolution in Sekunden)
+    max_points = request.args.get("max_points", type=int)
+    resolution = request.args.get("resolution", type=int)
+    mode = request.args.get("mode", "minmax")
+    # Optional: nur Punkte ab diesem Zeitpunkt (Epoch) für inkrementelle Updates
+    since = request.args.get("since", type=int)
+    # Optional: Taupunkt, Hitzeindex usw. mitliefern
+    derived = request.args.get("derived") == "1"
+    span = RANGES.get(range, 0)
+    # Unbekannter Zeitraum: ab jetzt, also keine Werte (wie bisher)
+    cutoff = int(datetime.now().timestamp()) - span
+    start = cutoff if since is None else max(cutoff, since)
+    fetch = start - DERIVED_LOOKBACK if derived else start
 
-    result = {
-        "timestamps": [],
-        "tempf": [],
-        "humidity": [],
-        "baromrelin": [],
-        "windspeedmph": [],
-        "winddir": [],
-        "uv": [],
-        "solarradiation": [],
-        "dailyrainin": [],
-        "hourlyrainin": [],
-        "rainratein": [],
+    if max_points and not resolution:
+        # Ein Bucket Reserve, weil die Bucket-Grenzen auf volle Vielfache fallen
+        resolution = -(-span // max(max_points - 1, 1))
+    tier = None
+    if mode != "lttb" or span > STORE_RETENTION:
+        tier = rollups.pick(span, resolution)
+    if tier is not None:
+        # Auf ein Vielfaches der Stufe runden, damit die Buckets sauber aufgehen
+        if resolution:
+            resolution = -(-resolution // tier.width) * tier.width
+        result = rollups.query(tier, fetch, resolution)
+        QUERY_ROWS.observe(
+            len(tier.ts) - bisect_left(tier.ts, fetch), path=f"rollup_{tier.width}"
+        )
+        if derived:
+            add_derived(result, start)
+        return data_response(result, cutoff)
+
+    if mode == "lttb" and max_points and store.count(cutoff) > max_points:
+        field = request.args.get("field", "tempf")
+        if field not in FIELDS:
+            abort(400)
+        # LTTB braucht den ganzen Zeitraum, "since" filtert erst die Auswahl
+        timestamps, columns = store.query(min(cutoff, fetch))
+        QUERY_ROWS.observe(len(timestamps), path="lttb")
+        if derived:
+            # Aus den Rohwerten rechnen, die Auswahl verteilt die Punkte ungleich
+            columns = dict(columns, **derived_series(timestamps, columns))
+        first = bisect_left(timestamps, cutoff)
+        picks = lttb_indices(timestamps[first:], columns[field][first:], max_points)
+        picks = [first + i for i in picks if timestamps[first + i] >= start]
+        result = {"timestamps": [timestamps[i] for i in picks]}
+        for key in FIELDS + (DERIVED_FIELDS if derived else []):
+            col = columns[key]
+            result[key] = [col[i] for i in picks]
+        return data_response(result, cutoff)
+
+    # Ob verdichtet wird, hängt vom ganzen Zeitraum ab, nicht von "since"
+    if max_points and store.count(cutoff) <= max_points:
+        resolution = request.args.get("resolution", type=int)
+    timestamps, columns = store.query(fetch)
+    QUERY_ROWS.observe(len(timestamps), path="raw")
+    if resolution and resolution > 0:
+        result = downsample(timestamps, columns, resolution)
+        result["resolution"] = resolution
+    else:
+        result = {"timestamps": timestamps.tolist()}
+        for key in FIELDS:
+            result[key] = columns[key].tolist()
+    if derived:
+        add_derived(result, start)
+    return data_response(result, cutoff)
+
+
+def parse_time(value):
+    # Epoch-Sekunden oder ISO-Datum (ohne Zone in Ortszeit), z. B. 2025-08-01T12:00
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp())
+
+
+def export_batches(rows, fields, precision, counted):
+    # Blöcke fester Größe, damit der Speicherbedarf nicht mit dem Zeitraum wächst
+    decimals = [None if precision == "full" else FIELD_DECIMALS[k] for k in fields]
+    rows = iter(rows)
+    total = 0
+    try:
+        while batch := list(itertools.islice(rows, EXPORT_BATCH)):
+            total += len(batch)
+            yield [
+                [ts]
+                + [
+                    v if v is None or d is None else round(v, d or None)
+                    for v, d in zip((values[k] for k in fields), decimals)
+                ]
+                for ts, values in batch
+            ]
+    finally:
+        QUERY_ROWS.observe(total, path=counted)
+
+
+def export_csv(batches, fields):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["timestamp"] + fields)
+    for batch in itertools.chain([[]], batches):
+        writer.writerows(batch)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+
+
+def export_ndjson(batches, fields):
+    keys = ["timestamp"] + fields
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), separators=(",", ":")) + "\n"
+            for row in batch
+        ).encode()
+
+
+class ChunkSink(io.RawIOBase):
+    """Nimmt die Bytes des Parquet-Writers entgegen und gibt sie blockweise ab;
+    tell() zählt weiter, weil der Writer daraus die Offsets im Footer baut."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_parquet(batches, fields):
+    schema = pa.schema(
+        [("timestamp", pa.timestamp("s", tz="UTC"))]
+        + [(key, pa.float64()) for key in fields]
+    )
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            # Eine Zeilengruppe pro Block
+            columns = [
+                pa.array(column, type=field.type)
+                for column, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+@app.route("/api/export")
+def api_export():
+    """Rohwerte als CSV, NDJSON oder Parquet, blockweise direkt aus dem Speicher
+    gestreamt statt vorher im Ganzen aufgebaut."""
+    station = get_station()
+    fmt = request.args.get("format", "csv")
+    fields = request.args.get("fields")
+    fields = fields.split(",") if fields else list(FIELDS)
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+    except ValueError:
+        abort(400)
+    if fmt not in EXPORT_FORMATS or any(key not in FIELDS for key in fields):
+        abort(400)
+    if fmt == "parquet" and pa is None:
+        return "Parquet-Export braucht pyarrow", 501
+
+    batches = export_batches(
+        station.storage.read(start, end),
+        fields,
+        request.args.get("precision"),
+        f"export_{fmt}",
+    )
+    writers = {"csv": export_csv, "ndjson": export_ndjson, "parquet": export_parquet}
+    body = writers[fmt](batches, fields)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{station.id}-export.{fmt}"'
     }
+    # Parquet ist schon komprimiert, Text wird bei Bedarf mitlaufend gepackt
+    if fmt != "parquet":
+        headers["Vary"] = "Accept-Encoding"
+        if negotiate_encoding(("gzip",)) == "gzip":
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype=EXPORT_FORMATS[fmt], headers=headers)
 
-    if os.path.isfile(DATA_FILE):
-        with open(DATA_FILE, newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    ts = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
-                    if ts >= cutoff:
-                        result["timestamps"].append(ts.strftime("%d.%m %H:%M"))
-                        for key in result:
-                            if key != "timestamps":
-                                result[key].append(float(row.get(key, 0)))
-                except:
-                    continue
 
-    return jsonify(result)
+@app.route("/api/import", methods=["POST"])
+def api_import():
+    """Nachträglicher Import: Ecowitt-CSV (SD-Karte, ecowitt.net), eigene CSV
+    oder Formulardaten als JSON/NDJSON. Die Station ergibt sich aus dem Passkey."""
+    passkey = request.headers.get("X-Passkey")
+    if passkey not in PASSKEYS:
+        abort(403)
+    station = stations[PASSKEYS[passkey]]
+    if ROLE == "reader":
+        # Nur der schreibende Prozess darf die Dateien umbauen
+        return "Import gerade nicht möglich, bitte erneut versuchen", 503
+    fmt = request.args.get("format") or IMPORT_FORMATS.get(request.mimetype)
+    if fmt not in IMPORT_FORMATS.values():
+        abort(415)
+    body = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+    stats = station.import_rows(read_import(body, fmt))
+    level = "error" if "error" in stats else "info"
+    station.ingest.log(debug_log.record(level, "import", station.id, **stats))
+    return jsonify(stats), 400 if "error" in stats else 200
+
+
+@app.route("/api/latest")
+def api_latest():
+    station = get_station()
+    seq, ts, values = station.store.latest()
+    etag = f"{station.id}-{seq}-{ts}"
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = jsonify(latest_payload(ts, values, station.alerts.active()))
+    response.set_etag(etag)
+    # Browser sollen jedes Mal nachfragen, bekommen dann aber meist nur 304
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/api/alerts")
+def api_alerts():
+    # Alle Regeln der Station mit aktuellem Wert und Zustand
+    station = get_station()
+    return jsonify([rule.status() for rule in station.alerts.rules])
+
+
+@app.route("/api/stream")
+def api_stream():
+    station = get_station()
+    store, feed, alerts = station.store, station.feed, station.alerts
+    # Zu viele offene Streams: die Seiten fallen dann auf Polling zurück
+    if not feed.subscribe():
+        return "Zu viele Live-Verbindungen", 503
+
+    def events():
+        seq = feed.seq
+        yield "retry: 5000\n\n"
+        _, ts, values = store.latest()
+        if ts is not None:
+            payload = latest_payload(ts, values, alerts.active())
+            yield f"data: {json.dumps(payload)}\n\n"
+        # Nach SSE_MAX_DURATION schließen, der Browser verbindet sich neu
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            new_seq, message = feed.wait(seq, SSE_HEARTBEAT)
+            if new_seq == seq:
+                yield ": ping\n\n"
+                continue
+            seq = new_seq
+            yield f"data: {message}\n\n"
+
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Freigeben beim Schließen der Antwort, auch wenn der Generator nie lief
+    # (HEAD, Abbruch vor dem ersten Block)
+    response.call_on_close(feed.unsubscribe)
+    return response
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.teardown_request
+def record_duration(exc):
+    # Nach allen after_request-Hooks, also inklusive Komprimierung
+    if request.endpoint is not None and "started" in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.started, endpoint=request.endpoint
+        )
+
+
+def gauge(name, help, samples, kind="gauge"):
+    # Werte, die beim Abruf aus vorhandenen Objekten gelesen werden
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in samples:
+        if value is not None:
+            yield f"{name}{format_labels(labels)} {value}"
+
+
+@app.route("/metrics")
+def metrics():
+    # Nur Zähler aus dem Speicher und Dateigrößen per stat, kein Lesen von Daten
+    lines = [line for metric in METRICS for line in metric.render()]
+    latest = {sid: station.store.latest() for sid, station in stations.items()}
+    lines += gauge(
+        "wetter_sensor_value",
+        "Letzter Messwert je Feld",
+        [
+            ({"station": sid, "field": key}, values[key])
+            for sid, (_, _, values) in latest.items()
+            if values is not None
+            for key in FIELDS
+        ],
+    )
+    lines += gauge(
+        "wetter_last_sample_timestamp_seconds",
+        "Zeitpunkt des letzten Messwerts",
+        [({"station": sid}, ts) for sid, (_, ts, _) in latest.items()],
+    )
+    lines += gauge(
+        "wetter_storage_bytes",
+        "Größe der Rohdaten auf der Karte",
+        [
+            ({"station": sid, "backend": station.storage.name}, station.storage.size())
+            for sid, station in stations.items()
+        ],
+    )
+    lines += gauge(
+        "wetter_ingest_queue_length",
+        "Eingereihte, noch nicht geschriebene Einträge",
+        [({"station": sid}, s.ingest.backlog()) for sid, s in stations.items()],
+    )
+    lines += gauge(
+        "wetter_sse_clients",
+        "Offene Live-Verbindungen",
+        [({"station": sid}, s.feed.clients) for sid, s in stations.items()],
+    )
+    lines += gauge(
+        "wetter_alert_active",
+        "Warnregel gerade ausgelöst (1) oder nicht (0)",
+        [
+            ({"station": sid, "rule": rule.name}, int(rule.active))
+            for sid, s in stations.items()
+            for rule in s.alerts.rules
+        ],
+    )
+    lines += gauge(
+        "wetter_cache_hits_total",
+        "Treffer im Antwort-Cache",
+        [({}, data_cache.hits)],
+        "counter",
+    )
+    lines += gauge(
+        "wetter_cache_misses_total",
+        "Fehlschläge im Antwort-Cache",
+        [({}, data_cache.misses)],
+        "counter",
+    )
+    lines += gauge(
+        "wetter_cache_entries",
+        "Einträge im Antwort-Cache",
+        [({}, len(data_cache.entries))],
+    )
+    response = make_response("\n".join(lines) + "\n")
+    response.mimetype = "text/plain"
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
+@app.route("/api/stations")
+def api_stations():
+    return jsonify(list(stations))
+
+
+def shutdown(signum, frame):
+    # systemd und Docker beenden mit SIGTERM; wie bei Strg+C regulär aussteigen,
+    # damit atexit die Warteschlangen noch schreibt und sichert
+    raise SystemExit(0)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
+    signal.signal(signal.SIGTERM, shutdown)
+    parser = argparse.ArgumentParser(description="FediCamp-Wetterstation")
+    sub = parser.add_subparsers(dest="command")
+    migrate_cmd = sub.add_parser(
+        "migrate", help="Rohwerte in ein anderes Backend kopieren"
+    )
+    migrate_cmd.add_argument("target", choices=sorted(STORAGES))
+    migrate_cmd.add_argument(
+        "--source", default=STORAGE_BACKEND, choices=sorted(STORAGES)
+    )
+    migrate_cmd.add_argument("--station", default=DEFAULT_STATION, choices=stations)
+    import_cmd = sub.add_parser(
+        "import", help="Historische Messwerte (CSV/JSON/NDJSON) nachträglich einspielen"
+    )
+    import_cmd.add_argument("file")
+    import_cmd.add_argument("--format", choices=sorted(IMPORT_FORMATS.values()))
+    import_cmd.add_argument("--station", default=DEFAULT_STATION, choices=stations)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        station = stations[args.station]
+        station.ingest.stop()
+        station.storage.close()
+        n = migrate(args.source, args.target, station.directory)
+        print(f"{n} Messwerte von {args.source} nach {args.target} übernommen.")
+    elif args.command == "import":
+        fmt = args.format or {
+            ".json": "json",
+            ".ndjson": "ndjson",
+            ".jsonl": "ndjson",
+        }.get(os.path.splitext(args.file)[1].lower(), "csv")
+        station = stations[args.station]
+        with open(args.file, encoding="utf-8-sig", newline="") as f:
+            stats = station.import_rows(read_import(f, fmt))
+        station.ingest.stop()
+        print(
+            f"{stats['inserted']} von {stats['received']} Messwerten übernommen, "
+            f"{stats['duplicates']} schon vorhanden, {stats['skipped']} unlesbar."
+        )
+        if "error" in stats:
+            raise SystemExit(f"Import abgebrochen: {stats['error']}")
+    else:
+        app.run(host="0.0.0.0", port=8000, threaded=True)